@@ -1,56 +1,57 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Query, Request, WebSocket
+from fastapi.responses import FileResponse, ORJSONResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from anyio import to_thread
+import httpx
+import orjson
 import os
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import time
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr, validator
-from typing import List, Optional, Union
+from functools import cached_property, lru_cache
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, Field, EmailStr, PrivateAttr, field_validator
+from typing import List, Literal, Optional, Union
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
+from cachetools import TTLCache
 import jwt
 from bson import ObjectId
+from pymongo import AsyncMongoClient, DeleteMany, IndexModel, InsertOne
+from pymongo.errors import DuplicateKeyError
+from redis import asyncio as aioredis
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.decorator import cache
 import secrets
-import string
 import re
+import csv
+import gzip
 import hashlib
+import zlib
+from base64 import urlsafe_b64encode
+import bisect
+import itertools
 import random
+import numpy as np
 
-# Initialize mock booking data for PAGE-11-BOOKINGS testing
-async def initialize_mock_bookings():
-    """Initialize mock booking data for testing purposes"""
-    
-    # Find existing test user or use any user with the test email
-    test_user = await db.users.find_one({"email": "user_001@test.com"})
-    if test_user:
-        test_user_id = str(test_user["_id"])
-    else:
-        # If no test user exists, create one
-        from passlib.context import CryptContext
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        hashed_password = pwd_context.hash("TestPass123!")
-        
-        user_doc = {
-            "email": "user_001@test.com",
-            "password_hash": hashed_password,
-            "role": "customer",
-            "mfa_enabled": False,
-            "failed_attempts": 0,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        result = await db.users.insert_one(user_doc)
-        test_user_id = str(result.inserted_id)
-    
-    # Sample customer bookings for different users
-    mock_bookings = [
-        # Upcoming booking
+# Mock bookings seeded at startup: (booking template, created_at offset,
+# updated_at offset). Templates without a user_id belong to the test user.
+MOCK_BOOKING_TEMPLATES = (
+    # Upcoming booking
+    (
         {
             "booking_id": "bk_upcoming_001",
-            "user_id": test_user_id,
             "partner_id": None,
             "status": "scheduled",
             "service": {
@@ -81,14 +82,15 @@ async def initialize_mock_bookings():
             },
             "payment": {},
             "promo_code": None,
-            "credits_applied": False,
-            "created_at": datetime.utcnow() + timedelta(days=1),
-            "updated_at": datetime.utcnow()
+            "credits_applied": False
         },
-        # In-progress booking
+        timedelta(days=1),
+        timedelta(0)
+    ),
+    # In-progress booking
+    (
         {
             "booking_id": "bk_inprogress_002",
-            "user_id": test_user_id,
             "partner_id": "partner_001",
             "status": "in_progress",
             "service": {
@@ -118,14 +120,15 @@ async def initialize_mock_bookings():
             },
             "payment": {},
             "promo_code": "SHINE10",
-            "credits_applied": False,
-            "created_at": datetime.utcnow() - timedelta(hours=2),
-            "updated_at": datetime.utcnow()
+            "credits_applied": False
         },
-        # Completed booking
+        -timedelta(hours=2),
+        timedelta(0)
+    ),
+    # Completed booking
+    (
         {
             "booking_id": "bk_completed_003",
-            "user_id": test_user_id,
             "partner_id": "partner_001",
             "status": "completed",
             "service": {
@@ -155,11 +158,13 @@ async def initialize_mock_bookings():
             },
             "payment": {},
             "promo_code": None,
-            "credits_applied": True,
-            "created_at": datetime.utcnow() - timedelta(days=7),
-            "updated_at": datetime.utcnow() - timedelta(days=6)
+            "credits_applied": True
         },
-        # Partner job for today
+        -timedelta(days=7),
+        -timedelta(days=6)
+    ),
+    # Partner job for today
+    (
         {
             "booking_id": "bk_partner_today_004",
             "user_id": "user_002",
@@ -192,43 +197,105 @@ async def initialize_mock_bookings():
             },
             "payment": {},
             "promo_code": None,
-            "credits_applied": False,
-            "created_at": datetime.utcnow() - timedelta(hours=1),
+            "credits_applied": False
+        },
+        -timedelta(hours=1),
+        timedelta(0)
+    )
+)
+
+# Initialize mock booking data for PAGE-11-BOOKINGS testing
+async def initialize_mock_bookings():
+    """Initialize mock booking data for testing purposes"""
+    
+    # Find existing test user or use any user with the test email
+    test_user = await db.users.find_one({"email": "user_001@test.com"}, {"_id": 1})
+    if test_user:
+        test_user_id = str(test_user["_id"])
+    else:
+        # If no test user exists, create one
+        hashed_password = await get_password_hash("TestPass123!")
+        
+        user_doc = {
+            "email": "user_001@test.com",
+            "password_hash": hashed_password,
+            "role": "customer",
+            "mfa_enabled": False,
+            "failed_attempts": 0,
+            "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
-    ]
+        result = await db.users.insert_one(user_doc)
+        test_user_id = str(result.inserted_id)
     
-    # Delete existing mock bookings first to avoid duplicates
-    await db.bookings.delete_many({"booking_id": {"$in": ["bk_upcoming_001", "bk_inprogress_002", "bk_completed_003", "bk_partner_today_004"]}})
+    # Stamp the shared templates with the owning user and fresh timestamps
+    now = datetime.utcnow()
+    mock_bookings = [
+        {
+            "user_id": test_user_id,
+            **template,
+            "created_at": now + created_offset,
+            "updated_at": now + updated_offset
+        }
+        for template, created_offset, updated_offset in MOCK_BOOKING_TEMPLATES
+    ]
     
-    # Insert mock bookings
-    for booking in mock_bookings:
-        await db.bookings.insert_one(booking)
+    # Replace existing mock bookings in a single round trip; ordered so the
+    # delete runs before the inserts and avoids duplicate booking_id errors
+    mock_booking_ids = [booking["booking_id"] for booking in mock_bookings]
+    await db.bookings.bulk_write(
+        [DeleteMany({"booking_id": {"$in": mock_booking_ids}})]
+        + [InsertOne(booking) for booking in mock_bookings],
+        ordered=True
+    )
+    for booking_id in mock_booking_ids:
+        booking_cache.pop(booking_id, None)
     
     print(f"Mock booking data initialized for user {test_user_id}")
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection (native PyMongo asyncio client, no thread-pool hop per operation)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncMongoClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
-# Create the main app without a prefix
-app = FastAPI()
+# Create the main app without a prefix (orjson-backed responses by default)
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# New hashes use Argon2id by default; bcrypt is kept to verify legacy hashes,
+# which are upgraded on the next successful login. PASSWORD_HASH_SCHEME=bcrypt
+# flips the migration direction if Argon2 has to be rolled back
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "argon2")
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    default=PASSWORD_HASH_SCHEME,
+    deprecated="auto",
+    argon2__time_cost=2,
+    argon2__memory_cost=19456,  # KiB
+    argon2__parallelism=1,
+    bcrypt__rounds=10
+)
+# Password hashing is CPU-bound; run it off the event loop (argon2/bcrypt release the GIL)
+PASSWORD_HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="password-hash")
 security = HTTPBearer()
 
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+DEFAULT_TOKEN_EXPIRES = timedelta(minutes=15)
+
+# Redis (optional - response cache and dispatch state fall back to in-process
+# memory when unset). from_url is lazy; nothing connects until first use
+REDIS_URL = os.getenv("REDIS_URL")
+redis_client = aioredis.from_url(REDIS_URL) if REDIS_URL else None
 
 # Roles
 class UserRole(str):
@@ -244,29 +311,100 @@ class PartnerStatus(str):
 USERNAME_PATTERN = re.compile(r'^[a-zA-Z0-9_]{3,30}$')
 PASSWORD_PATTERN = re.compile(r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[!@#$%^&*()_\-+=\[\]{}:;\'\"<>,.?/]).{8,64}$')
 PHONE_PATTERN = re.compile(r'^\+[1-9]\d{7,14}$')
+EMAIL_SIMPLE_PATTERN = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
+
+# User projections (fetch only the fields a code path reads)
+LOGIN_USER_PROJECTION = {
+    "_id": 1,
+    "email": 1,
+    "username": 1,
+    "password_hash": 1,
+    "phone": 1,
+    "role": 1,
+    "partner_status": 1,
+    "mfa_enabled": 1,
+    "locked_until": 1
+}
+# Secrets are never needed downstream of authentication
+CURRENT_USER_PROJECTION = {"password_hash": 0, "mfa_code": 0, "reset_otp": 0}
+MFA_VERIFY_USER_PROJECTION = {
+    "email": 1,
+    "username": 1,
+    "phone": 1,
+    "role": 1,
+    "partner_status": 1,
+    "mfa_enabled": 1
+}
+RESET_START_USER_PROJECTION = {"_id": 1}
+RESET_VERIFY_USER_PROJECTION = {"_id": 1}
 
 # Helper Functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(PASSWORD_HASH_POOL, pwd_context.verify, plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(PASSWORD_HASH_POOL, pwd_context.hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode["exp"] = datetime.utcnow() + (expires_delta or DEFAULT_TOKEN_EXPIRES)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Token entropy is drawn from os.urandom in blocks and handed out without
+# reuse, so thousands of ids share one getrandom syscall
+TOKEN_ENTROPY_BLOCK_BYTES = 64 * 1024
+token_entropy = b""
+token_entropy_offset = 0
+
+def reset_token_entropy():
+    """Forked workers must never hand out the parent's remaining entropy"""
+    global token_entropy, token_entropy_offset
+    token_entropy, token_entropy_offset = b"", 0
+
+os.register_at_fork(after_in_child=reset_token_entropy)
+
+def random_bytes(nbytes: int) -> bytes:
+    global token_entropy, token_entropy_offset
+    start = token_entropy_offset
+    if start + nbytes > len(token_entropy):
+        token_entropy, start = os.urandom(max(TOKEN_ENTROPY_BLOCK_BYTES, nbytes)), 0
+    token_entropy_offset = start + nbytes
+    return token_entropy[start:start + nbytes]
+
+def encode_token(raw: bytes) -> str:
+    return urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def urlsafe_token(nbytes: int) -> str:
+    """secrets.token_urlsafe drawing from the pooled entropy block"""
+    return encode_token(random_bytes(nbytes))
+
+def urlsafe_token_pair(first_nbytes: int, second_nbytes: int) -> tuple[str, str]:
+    """Two independent url-safe tokens from a single entropy draw"""
+    raw = random_bytes(first_nbytes + second_nbytes)
+    return encode_token(raw[:first_nbytes]), encode_token(raw[first_nbytes:])
+
+def urlsafe_tokens(nbytes: int, count: int) -> list[str]:
+    """`count` url-safe tokens of `nbytes` each from a single entropy draw"""
+    raw = random_bytes(nbytes * count)
+    if nbytes % 3:
+        return [encode_token(raw[start:start + nbytes]) for start in range(0, len(raw), nbytes)]
+    # Whole 3-byte groups encode without padding, so one encode can be sliced
+    width = nbytes // 3 * 4
+    encoded = urlsafe_b64encode(raw).decode("ascii")
+    return [encoded[start:start + width] for start in range(0, len(encoded), width)]
+
+def stable_hash(value: str) -> int:
+    """Process-independent hash for mock sampling; hash() is salted per process"""
+    return zlib.crc32(value.encode())
+
 def generate_otp_code():
-    return ''.join(secrets.choice(string.digits) for _ in range(6))
+    return f"{secrets.randbelow(1000000):06d}"
 
-def hash_otp(otp: str) -> str:
-    return hashlib.sha256(otp.encode()).hexdigest()
+def hash_otp(otp: str) -> bytes:
+    return hashlib.sha256(otp.encode()).digest()
 
 def validate_password_strength(password: str) -> bool:
     return bool(PASSWORD_PATTERN.match(password))
@@ -277,21 +415,16 @@ def normalize_email(email: str) -> str:
 def normalize_username(username: str) -> str:
     return username.lower().strip()
 
+@lru_cache(maxsize=4096)
 def is_valid_identifier(identifier: str) -> tuple[bool, str]:
     """Check if identifier is valid email or username. Returns (is_valid, type)"""
     identifier = identifier.strip()
     
     # Check if it's an email
     if '@' in identifier:
-        try:
-            # Simple email validation regex
-            email_pattern = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
-            if email_pattern.match(identifier):
-                return True, 'email'
-            else:
-                return False, 'invalid'
-        except:
-            return False, 'invalid'
+        if EMAIL_SIMPLE_PATTERN.match(identifier):
+            return True, 'email'
+        return False, 'invalid'
     
     # Check if it's a username
     if USERNAME_PATTERN.match(identifier):
@@ -304,20 +437,38 @@ class User(BaseModel):
     id: Optional[str] = None
     email: EmailStr
     username: Optional[str] = None
-    password_hash: str
+    password_hash: Optional[str] = None  # left out of the cached current user
     phone: Optional[str] = None
     role: str = UserRole.CUSTOMER
     partner_status: Optional[str] = None
     mfa_enabled: bool = False
-    mfa_code: Optional[str] = None
+    mfa_code: Optional[bytes] = None
     mfa_code_expires: Optional[datetime] = None
-    reset_otp: Optional[str] = None
+    reset_otp: Optional[bytes] = None
     reset_otp_expires: Optional[datetime] = None
     reset_channel: Optional[str] = None
     failed_attempts: int = 0
     locked_until: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    # Parsed Mongo _id, kept alongside the cached user so it is never re-parsed
+    _oid: Optional[ObjectId] = PrivateAttr(default=None)
+    
+    @property
+    def oid(self) -> ObjectId:
+        if self._oid is None:
+            self._oid = ObjectId(self.id)
+        return self._oid
+    
+    # Computed once per cached User rather than per request
+    @cached_property
+    def partner_display_name(self) -> str:
+        return f"{self.email.split('@', 1)[0]} P."
+    
+    @cached_property
+    def display_name(self) -> str:
+        return self.email.split('@', 1)[0].title()
 
 class UserSignup(BaseModel):
     email: EmailStr
@@ -327,11 +478,13 @@ class UserSignup(BaseModel):
     phone: Optional[str] = None
     accept_tos: bool
 
-    @validator('email')
+    @field_validator('email')
+    @classmethod
     def normalize_email_field(cls, v):
         return normalize_email(v)
 
-    @validator('username')
+    @field_validator('username')
+    @classmethod
     def validate_username(cls, v):
         if v is not None:
             v = v.strip()
@@ -339,13 +492,15 @@ class UserSignup(BaseModel):
                 raise ValueError('Username must be 3–30 letters/numbers/underscore.')
         return v
 
-    @validator('password')
+    @field_validator('password')
+    @classmethod
     def validate_password(cls, v):
         if not validate_password_strength(v):
             raise ValueError('Password must be 8–64 chars and include uppercase, lowercase, digit, and special character.')
         return v
 
-    @validator('phone')
+    @field_validator('phone')
+    @classmethod
     def validate_phone(cls, v):
         if v is not None:
             v = v.strip()
@@ -353,7 +508,8 @@ class UserSignup(BaseModel):
                 raise ValueError('Phone number must be valid E.164 format (e.g., +14155552671).')
         return v
 
-    @validator('accept_tos')
+    @field_validator('accept_tos')
+    @classmethod
     def validate_tos(cls, v):
         if not v:
             raise ValueError('You must accept the Terms of Service and Privacy Policy.')
@@ -389,7 +545,8 @@ class ResetVerifyRequest(BaseModel):
     otp: str
     new_password: str
 
-    @validator('new_password')
+    @field_validator('new_password')
+    @classmethod
     def validate_password(cls, v):
         if not validate_password_strength(v):
             raise ValueError('Password must be 8–64 chars and include uppercase, lowercase, digit, and special character.')
@@ -415,27 +572,94 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
-# Dependency to get current user
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    credentials_exception = HTTPException(
+# Authenticated user caches:
+# raw bearer token -> (user id, parsed ObjectId, token exp timestamp), skips JWT decode
+# user id -> User without secrets, skips the users lookup across tokens
+AUTH_CACHE_MAX_SIZE = 10000
+AUTH_CACHE_TTL_SECONDS = 60
+auth_token_cache = TTLCache(maxsize=AUTH_CACHE_MAX_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+auth_user_cache = TTLCache(maxsize=AUTH_CACHE_MAX_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
+# With Redis, invalidations are broadcast so every worker drops its copy
+AUTH_INVALIDATE_CHANNEL = "auth:invalidate"
+AUTH_LISTENER_RETRY_SECONDS = 1
+
+async def invalidate_cached_user(user_id: str):
+    """Drop the cached user in every worker after their profile changes"""
+    auth_user_cache.pop(user_id, None)
+    if redis_client is not None:
+        await redis_client.publish(AUTH_INVALIDATE_CHANNEL, user_id)
+
+async def run_auth_invalidation_listener():
+    """Apply other workers' invalidations to this worker's user cache"""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(AUTH_INVALIDATE_CHANNEL)
+            # Anything published while unsubscribed was missed, so start clean
+            auth_user_cache.clear()
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                if message is not None:
+                    auth_user_cache.pop(message["data"].decode(), None)
+        except aioredis.RedisError:
+            logger.exception("Auth invalidation listener disconnected")
+        finally:
+            await pubsub.reset()
+        await asyncio.sleep(AUTH_LISTENER_RETRY_SECONDS)
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+# Dependency to get current user. FastAPI resolves it once per request, and a
+# cache hit below costs two dict lookups, so there is no JWT work on repeat tokens
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
     
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except jwt.PyJWTError:
-        raise credentials_exception
-    
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    # Skip JWT decode for recently seen, unexpired tokens
+    cached = auth_token_cache.get(token)
+    if cached is not None and time.time() < cached[2]:
+        user_id, user_oid = cached[0], cached[1]
+    else:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id: str = payload.get("sub")
+            if user_id is None or not ObjectId.is_valid(user_id):
+                raise credentials_exception()
+        except jwt.PyJWTError:
+            raise credentials_exception()
+        user_oid = ObjectId(user_id)
+        auth_token_cache[token] = (user_id, user_oid, payload.get("exp", 0))
+    
+    # Cache reads and writes never straddle an await, so no lock is needed
+    current_user = auth_user_cache.get(user_id)
+    if current_user is not None:
+        return current_user
+    
+    user = await db.users.find_one({"_id": user_oid}, CURRENT_USER_PROJECTION)
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
+    
+    current_user = User(**user, id=str(user["_id"]))
+    current_user._oid = user_oid
+    auth_user_cache[user_id] = current_user
     
-    return User(**user, id=str(user["_id"]))
+    return current_user
+
+@lru_cache(maxsize=None)
+def require_role(role: str):
+    """Dependency returning the current user, or 403 unless they have `role`"""
+    # lru_cache gives one callable per role, so FastAPI's per-request cache applies
+    async def role_checked_user(current_user: User = Depends(get_current_user)) -> User:
+        if current_user.role != role:
+            raise HTTPException(status_code=403, detail=f"{role.title()} access required")
+        return current_user
+    
+    return role_checked_user
 
 # Rate limiting helper
 async def check_rate_limit(identifier: str, action_type: str) -> bool:
@@ -448,26 +672,10 @@ async def check_rate_limit(identifier: str, action_type: str) -> bool:
 # Enhanced Auth Routes
 @api_router.post("/auth/signup", response_model=TokenResponse)
 async def signup(user_data: UserSignup):
-    # Check if email already exists
-    existing_email = await db.users.find_one({"email": user_data.email})
-    if existing_email:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Email already registered"
-        )
-    
-    # Check if username already exists (if provided)
-    if user_data.username:
-        username_lower = normalize_username(user_data.username)
-        existing_username = await db.users.find_one({"username_lower": username_lower})
-        if existing_username:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Username already taken"
-            )
+    # Email/username uniqueness is enforced by the unique indexes on insert
     
     # Hash password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     
     # Set partner status if role is partner
     partner_status = PartnerStatus.PENDING if user_data.role == UserRole.PARTNER else None
@@ -493,19 +701,19 @@ async def signup(user_data: UserSignup):
     try:
         result = await db.users.insert_one(user_dict)
         user_id = str(result.inserted_id)
-    except Exception as e:
-        # Handle MongoDB duplicate key errors
-        if "duplicate key error" in str(e):
-            if "email" in str(e):
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="Email already registered"
-                )
-            elif "username_lower" in str(e):
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="Username already taken"
-                )
+    except DuplicateKeyError as e:
+        # Handle MongoDB duplicate key errors by the violated index
+        key_pattern = (e.details or {}).get("keyPattern", {})
+        if "username_lower" in key_pattern:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Username already taken"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Email already registered"
+        )
+    except Exception:
         # Handle other database errors
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -513,13 +721,12 @@ async def signup(user_data: UserSignup):
         )
     
     # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user_id}, expires_delta=access_token_expires
+        data={"sub": user_id}, expires_delta=ACCESS_TOKEN_EXPIRES
     )
     
     # Return response
-    user_response = UserResponse(
+    user_response = UserResponse.model_construct(
         id=user_id,
         email=user_data.email,
         username=user_data.username,
@@ -536,8 +743,20 @@ async def signup(user_data: UserSignup):
 
 # Home API Routes
 
+# Response cache key builders
+def user_scoped_key_builder(func, namespace: str = "", *, request=None, response=None, args=(), kwargs=None):
+    """Cache key per endpoint and authenticated user"""
+    current_user = (kwargs or {}).get("current_user")
+    return f"{namespace}:{func.__name__}:{current_user.id if current_user else 'anon'}"
+
+def nearby_partners_key_builder(func, namespace: str = "", *, request=None, response=None, args=(), kwargs=None):
+    """Cache key on location rounded to ~100m and search radius"""
+    kwargs = kwargs or {}
+    return f"{namespace}:near:{round(kwargs['lat'], 3)}:{round(kwargs['lng'], 3)}:{kwargs['radius_km']}"
+
 # Customer Home APIs
 @api_router.get("/partners/nearby")
+@cache(expire=10, key_builder=nearby_partners_key_builder)
 async def get_nearby_partners(lat: float, lng: float, radius_km: Optional[float] = 5.0):
     """Get nearby partners for customer map view"""
     # Mock data - in production, this would query a geospatial database
@@ -574,21 +793,39 @@ async def get_nearby_partners(lat: float, lng: float, radius_km: Optional[float]
     
     return {"partners": mock_partners}
 
+# Mock metric generator for dashboard endpoints
+mock_rng = np.random.default_rng()
+
+# Mock surge draws, precomputed at import and cycled per request:
+# slot -> (surge active, multiplier). 30% of slots are surging at 1.2-2.5x
+SURGE_TABLE_SIZE = 4096
+SURGE_TABLE = tuple(
+    (active, multiplier if active else 1.0)
+    for active, multiplier in zip(
+        (mock_rng.random(SURGE_TABLE_SIZE) < 0.3).tolist(),
+        np.round(mock_rng.uniform(1.2, 2.5, SURGE_TABLE_SIZE), 1).tolist()
+    )
+)
+surge_counter = itertools.count()
+
+def next_surge_draw() -> tuple[bool, float]:
+    return SURGE_TABLE[next(surge_counter) & (SURGE_TABLE_SIZE - 1)]
+
 @api_router.get("/pricing/surge")
 async def get_surge_status(lat: float, lng: float):
     """Get surge pricing status for customer location"""
     # Mock surge logic - in production, this would check real demand/supply
-    import random
-    
-    # 30% chance of surge pricing for demo
-    surge_active = random.random() < 0.3
-    multiplier = round(random.uniform(1.2, 2.5), 1) if surge_active else 1.0
+    surge_active, multiplier = next_surge_draw()
     
     return {
         "active": surge_active,
         "multiplier": multiplier
     }
 
+# Owner tile ranges: activeJobs, partnersOnline, supportOpen, gmvToday
+OWNER_TILE_RANGES_LOW = (15, 8, 2, 1500)
+OWNER_TILE_RANGES_HIGH = (45, 25, 12, 8500)
+
 # Partner Home APIs  
 @api_router.get("/partner/home")
 async def get_partner_dashboard(current_user: User = Depends(get_current_user)):
@@ -652,6 +889,7 @@ async def set_partner_availability(
 
 # Owner Home APIs
 @api_router.get("/owner/tiles")
+@cache(expire=30, key_builder=user_scoped_key_builder)
 async def get_owner_tiles(current_user: User = Depends(get_current_user)):
     """Get owner dashboard tiles data"""
     if current_user.role != UserRole.OWNER:
@@ -661,53 +899,66 @@ async def get_owner_tiles(current_user: User = Depends(get_current_user)):
         )
     
     # Mock tiles data - in production, these would be real metrics
-    import random
+    # (one vectorized draw for all tiles; bounds are inclusive)
+    active_jobs, partners_online, support_open, gmv_today = mock_rng.integers(
+        OWNER_TILE_RANGES_LOW, OWNER_TILE_RANGES_HIGH, endpoint=True
+    ).tolist()
     
     return {
-        "activeJobs": random.randint(15, 45),
-        "partnersOnline": random.randint(8, 25),
-        "supportOpen": random.randint(2, 12),
-        "gmvToday": random.randint(1500, 8500)
+        "activeJobs": active_jobs,
+        "partnersOnline": partners_online,
+        "supportOpen": support_open,
+        "gmvToday": gmv_today
     }
 
 # Service Selection APIs
 
+# Static cleaning services catalog
+SERVICES_CATALOG = (
+    {
+        "code": "basic",
+        "name": "Basic Clean",
+        "basePrice": 80,
+        "defaults": {
+            "bedrooms": 2,
+            "bathrooms": 1
+        },
+        "desc": "Standard tidy & surfaces - dusting, vacuuming, basic bathroom and kitchen clean"
+    },
+    {
+        "code": "deep",
+        "name": "Deep Clean", 
+        "basePrice": 150,
+        "defaults": {
+            "bedrooms": 2,
+            "bathrooms": 1
+        },
+        "desc": "Detailed clean incl. baseboards - comprehensive cleaning including inside appliances, baseboards, and detailed scrubbing"
+    },
+    {
+        "code": "bathroom",
+        "name": "Bathroom-only",
+        "basePrice": 45,
+        "defaults": {
+            "bathrooms": 1
+        },
+        "desc": "Bathrooms only - thorough cleaning of all bathroom fixtures, tiles, and surfaces"
+    }
+)
+SERVICE_CODES = frozenset(service["code"] for service in SERVICES_CATALOG)
+
+# The catalog never changes at runtime, so serialize it once at import
+SERVICES_CATALOG_BODY = orjson.dumps({"services": SERVICES_CATALOG})
+SERVICES_CATALOG_HEADERS = MappingProxyType({"Cache-Control": "max-age=86400"})
+
 @api_router.get("/services/catalog")
 async def get_services_catalog():
     """Get available cleaning services catalog"""
-    services = [
-        {
-            "code": "basic",
-            "name": "Basic Clean",
-            "basePrice": 80,
-            "defaults": {
-                "bedrooms": 2,
-                "bathrooms": 1
-            },
-            "desc": "Standard tidy & surfaces - dusting, vacuuming, basic bathroom and kitchen clean"
-        },
-        {
-            "code": "deep",
-            "name": "Deep Clean", 
-            "basePrice": 150,
-            "defaults": {
-                "bedrooms": 2,
-                "bathrooms": 1
-            },
-            "desc": "Detailed clean incl. baseboards - comprehensive cleaning including inside appliances, baseboards, and detailed scrubbing"
-        },
-        {
-            "code": "bathroom",
-            "name": "Bathroom-only",
-            "basePrice": 45,
-            "defaults": {
-                "bathrooms": 1
-            },
-            "desc": "Bathrooms only - thorough cleaning of all bathroom fixtures, tiles, and surfaces"
-        }
-    ]
-    
-    return {"services": services}
+    return Response(
+        content=SERVICES_CATALOG_BODY,
+        media_type="application/json",
+        headers=SERVICES_CATALOG_HEADERS
+    )
 
 
 
@@ -733,9 +984,8 @@ async def set_partner_capabilities(
     services_offered = request.get("servicesOffered", [])
     
     # Validate services
-    valid_services = ["basic", "deep", "bathroom"]
     for service in services_offered:
-        if service not in valid_services:
+        if service not in SERVICE_CODES:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Invalid service: {service}"
@@ -744,7 +994,7 @@ async def set_partner_capabilities(
     # In production, save to partner profile in database
     # For now, just return success
     await db.users.update_one(
-        {"_id": ObjectId(current_user.id)},
+        {"_id": current_user.oid},
         {"$set": {
             "services_offered": services_offered,
             "updated_at": datetime.utcnow()
@@ -765,12 +1015,12 @@ async def login(user_data: UserLogin):
     
     # Find user by identifier
     if identifier_type == 'email':
-        user = await db.users.find_one({"email": normalize_email(user_data.identifier)})
+        user = await db.users.find_one({"email": normalize_email(user_data.identifier)}, LOGIN_USER_PROJECTION)
     else:  # username
-        user = await db.users.find_one({"username_lower": normalize_username(user_data.identifier)})
+        user = await db.users.find_one({"username_lower": normalize_username(user_data.identifier)}, LOGIN_USER_PROJECTION)
     
     # Check credentials
-    if not user or not verify_password(user_data.password, user["password_hash"]):
+    if not user or not await verify_password(user_data.password, user["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect credentials"
@@ -786,25 +1036,26 @@ async def login(user_data: UserLogin):
         )
     
     # Reset failed attempts on successful login
+    login_updates = {"failed_attempts": 0, "locked_until": None}
+    
+    # Upgrade legacy bcrypt hashes to the current default scheme
+    if pwd_context.needs_update(user["password_hash"]):
+        login_updates["password_hash"] = await get_password_hash(user_data.password)
+    
+    # Generate the MFA code up front so it lands in the same write
+    mfa_required = user.get("mfa_enabled", False)
+    if mfa_required:
+        mfa_code = generate_otp_code()
+        login_updates["mfa_code"] = hash_otp(mfa_code)
+        login_updates["mfa_code_expires"] = datetime.utcnow() + timedelta(minutes=15)
+    
     await db.users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {"failed_attempts": 0, "locked_until": None}}
+        {"_id": user["_id"]},
+        {"$set": login_updates}
     )
     
     # Check if MFA is required
-    if user.get("mfa_enabled", False):
-        # Generate and store MFA code
-        mfa_code = generate_otp_code()
-        mfa_expires = datetime.utcnow() + timedelta(minutes=15)
-        
-        await db.users.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": {
-                "mfa_code": hash_otp(mfa_code),
-                "mfa_code_expires": mfa_expires
-            }}
-        )
-        
+    if mfa_required:
         # In production, send MFA code via SMS/Email
         # For dev, return the code
         return {
@@ -815,12 +1066,11 @@ async def login(user_data: UserLogin):
         }
     
     # Regular login without MFA
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user_id}, expires_delta=access_token_expires
+        data={"sub": user_id}, expires_delta=ACCESS_TOKEN_EXPIRES
     )
     
-    user_response = UserResponse(
+    user_response = UserResponse.model_construct(
         id=user_id,
         email=user["email"],
         username=user.get("username"),
@@ -837,36 +1087,35 @@ async def login(user_data: UserLogin):
 
 @api_router.post("/auth/mfa/verify", response_model=MFAVerifyResponse)
 async def verify_mfa(mfa_data: MFAVerifyRequest):
-    # Find user
-    user = await db.users.find_one({"_id": ObjectId(mfa_data.user_id)})
-    if not user:
+    if not ObjectId.is_valid(mfa_data.user_id):
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid code"
         )
     
-    # Check MFA code
-    if (not user.get("mfa_code") or 
-        user["mfa_code"] != hash_otp(mfa_data.code) or
-        datetime.utcnow() > user.get("mfa_code_expires", datetime.min)):
+    # Match and consume the MFA code atomically, so each code works once
+    user = await db.users.find_one_and_update(
+        {
+            "_id": ObjectId(mfa_data.user_id),
+            "mfa_code": hash_otp(mfa_data.code),
+            "mfa_code_expires": {"$gt": datetime.utcnow()}
+        },
+        {"$unset": {"mfa_code": "", "mfa_code_expires": ""}},
+        projection=MFA_VERIFY_USER_PROJECTION
+    )
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid code"
         )
-    
-    # Clear MFA code
-    await db.users.update_one(
-        {"_id": ObjectId(mfa_data.user_id)},
-        {"$unset": {"mfa_code": "", "mfa_code_expires": ""}}
-    )
+    await invalidate_cached_user(mfa_data.user_id)
     
     # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": mfa_data.user_id, "mfa_verified": True}, expires_delta=access_token_expires
+        data={"sub": mfa_data.user_id, "mfa_verified": True}, expires_delta=ACCESS_TOKEN_EXPIRES
     )
     
-    user_response = UserResponse(
+    user_response = UserResponse.model_construct(
         id=mfa_data.user_id,
         email=user["email"],
         username=user.get("username"),
@@ -889,10 +1138,9 @@ async def reset_password_start(reset_data: ResetStartRequest):
     # Determine if it's email or phone
     if '@' in identifier:
         # Simple email validation
-        email_pattern = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
-        if email_pattern.match(identifier):
+        if EMAIL_SIMPLE_PATTERN.match(identifier):
             channel = "email"
-            user = await db.users.find_one({"email": normalize_email(identifier)})
+            user = await db.users.find_one({"email": normalize_email(identifier)}, RESET_START_USER_PROJECTION)
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -905,7 +1153,7 @@ async def reset_password_start(reset_data: ResetStartRequest):
                 detail="Invalid email or phone format."
             )
         channel = "sms"
-        user = await db.users.find_one({"phone": identifier})
+        user = await db.users.find_one({"phone": identifier}, RESET_START_USER_PROJECTION)
     else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -928,7 +1176,7 @@ async def reset_password_start(reset_data: ResetStartRequest):
         
         # In production, send OTP via email/SMS
         # For dev, log the OTP
-        logger.info(f"Reset OTP for {identifier}: {otp}")
+        logger.info("Reset OTP for %s: %s", identifier, otp)
     
     return ResetStartResponse(sent=True, channel=channel)
 
@@ -936,47 +1184,48 @@ async def reset_password_start(reset_data: ResetStartRequest):
 async def reset_password_verify(reset_data: ResetVerifyRequest):
     identifier = reset_data.email_or_phone.strip()
     
-    # Find user by identifier
+    # Match and consume the OTP atomically, so each code works once; the new
+    # password is only hashed after the OTP has been accepted
+    otp_query = {
+        "reset_otp": hash_otp(reset_data.otp),
+        "reset_otp_expires": {"$gt": datetime.utcnow()}
+    }
     if '@' in identifier:
-        user = await db.users.find_one({"email": normalize_email(identifier)})
+        otp_query["email"] = normalize_email(identifier)
     else:
-        user = await db.users.find_one({"phone": identifier})
+        otp_query["phone"] = identifier
     
+    user = await db.users.find_one_and_update(
+        otp_query,
+        {"$unset": {
+            "reset_otp": "",
+            "reset_otp_expires": "",
+            "reset_channel": ""
+        }},
+        projection=RESET_VERIFY_USER_PROJECTION
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid OTP"
         )
     
-    # Check OTP
-    if (not user.get("reset_otp") or 
-        user["reset_otp"] != hash_otp(reset_data.otp) or
-        datetime.utcnow() > user.get("reset_otp_expires", datetime.min)):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid OTP"
-        )
-    
-    # Update password and clear reset data
-    hashed_password = get_password_hash(reset_data.new_password)
+    # Update password
+    hashed_password = await get_password_hash(reset_data.new_password)
     await db.users.update_one(
         {"_id": user["_id"]},
         {"$set": {
             "password_hash": hashed_password,
             "updated_at": datetime.utcnow()
-        },
-        "$unset": {
-            "reset_otp": "",
-            "reset_otp_expires": "",
-            "reset_channel": ""
         }}
     )
+    await invalidate_cached_user(str(user["_id"]))
     
     return ResetVerifyResponse(ok=True)
 
 @api_router.get("/auth/me", response_model=UserResponse)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
-    return UserResponse(
+    return UserResponse.model_construct(
         id=current_user.id,
         email=current_user.email,
         username=current_user.username,
@@ -997,17 +1246,17 @@ async def switch_role(current_user: User = Depends(get_current_user)):
     
     # Update user role to customer
     await db.users.update_one(
-        {"_id": ObjectId(current_user.id)},
+        {"_id": current_user.oid},
         {"$set": {"role": UserRole.CUSTOMER, "updated_at": datetime.utcnow()}}
     )
+    await invalidate_cached_user(current_user.id)
     
     # Create new access token with customer role
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": current_user.id}, expires_delta=access_token_expires
+        data={"sub": current_user.id}, expires_delta=ACCESS_TOKEN_EXPIRES
     )
     
-    user_response = UserResponse(
+    user_response = UserResponse.model_construct(
         id=current_user.id,
         email=current_user.email,
         username=current_user.username,
@@ -1043,6 +1292,9 @@ class SaveAddressResponse(BaseModel):
 class AddressResponse(AddressBase):
     id: str
 
+ADDRESS_RESPONSE_FIELDS = tuple(AddressBase.model_fields)
+ADDRESS_RESPONSE_PROJECTION = dict.fromkeys(ADDRESS_RESPONSE_FIELDS, 1)
+
 class ListAddressesResponse(BaseModel):
     addresses: List[AddressResponse]
 
@@ -1069,26 +1321,37 @@ class ETAResponse(BaseModel):
     window: str
     distanceKm: float
 
+class ETABatchRequest(BaseModel):
+    lats: List[float]
+    lngs: List[float]
+    timing: dict
+
+class ETABatchResponse(BaseModel):
+    previews: List[ETAResponse]
+
+# Mock ETA model: Manhattan distance from the SF depot, bucketed by km
+ETA_ORIGIN_LAT = 37.7749
+ETA_ORIGIN_LNG = -122.4194
+ETA_THRESHOLDS_KM = (5, 15)
+ETA_WINDOWS = ("15–25 min", "30–45 min", "45–60 min")
+ETA_MAX_DISTANCE_KM = 25.0
+
 # Address API Endpoints
 @api_router.get("/addresses", response_model=ListAddressesResponse)
 async def list_saved_addresses(current_user: User = Depends(get_current_user)):
     """List saved addresses for the current user"""
-    addresses = await db.addresses.find({"user_id": current_user.id}).to_list(100)
+    addresses = await db.addresses.find(
+        {"user_id": current_user.id}, ADDRESS_RESPONSE_PROJECTION
+    ).to_list(100)
     
-    address_responses = []
-    for addr in addresses:
-        address_responses.append(AddressResponse(
+    # Stored addresses were validated on save; skip re-validating each one
+    address_responses = [
+        AddressResponse.model_construct(
             id=str(addr["_id"]),
-            label=addr.get("label"),
-            line1=addr["line1"],
-            line2=addr.get("line2"),
-            city=addr["city"],
-            state=addr["state"],
-            postalCode=addr["postalCode"],
-            country=addr["country"],
-            lat=addr["lat"],
-            lng=addr["lng"]
-        ))
+            **{field: addr.get(field) for field in ADDRESS_RESPONSE_FIELDS}
+        )
+        for addr in addresses
+    ]
     
     return ListAddressesResponse(addresses=address_responses)
 
@@ -1114,24 +1377,13 @@ async def save_address(
         )
     
     # Create address document
-    address_doc = {
-        "user_id": current_user.id,
-        "label": address_data.label,
-        "line1": address_data.line1,
-        "line2": address_data.line2,
-        "city": address_data.city,
-        "state": address_data.state,
-        "postalCode": address_data.postalCode,
-        "country": address_data.country,
-        "lat": address_data.lat,
-        "lng": address_data.lng,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
-    }
+    now = datetime.utcnow()
+    address_doc = address_data.model_dump()
+    address_doc.update(_id=ObjectId(), user_id=current_user.id, created_at=now, updated_at=now)
     
-    result = await db.addresses.insert_one(address_doc)
+    await db.addresses.insert_one(address_doc)
     
-    return SaveAddressResponse(id=str(result.inserted_id))
+    return SaveAddressResponse(id=str(address_doc["_id"]))
 
 @api_router.get("/places/autocomplete", response_model=AutocompleteResponse)
 async def autocomplete_places(q: str):
@@ -1141,10 +1393,13 @@ async def autocomplete_places(q: str):
     if not q or len(q) < 3:
         return AutocompleteResponse(candidates=[])
     
+    # Stable, non-cryptographic place id suffix, computed once per query
+    query_hash = f"{zlib.crc32(q.encode()):08x}"
+    
     # Generate mock candidates based on the query
     mock_candidates = [
         AutocompleteCandidate(
-            placeId=f"place_{i}_{hashlib.md5(q.encode()).hexdigest()[:8]}",
+            placeId=f"place_{i}_{query_hash}",
             label=f"{q} {suffix}",
             line1=f"{i*100 + 23} {q} {suffix}",
             city="San Francisco" if i % 2 == 0 else "New York",
@@ -1165,15 +1420,10 @@ async def get_eta_preview(eta_request: ETARequest):
     
     # Mock ETA calculation based on coordinates
     # Simulate different ETAs based on location
-    base_distance = abs(eta_request.lat - 37.7749) + abs(eta_request.lng + 122.4194)
+    base_distance = abs(eta_request.lat - ETA_ORIGIN_LAT) + abs(eta_request.lng - ETA_ORIGIN_LNG)
     distance_km = round(base_distance * 100, 1)  # Convert to reasonable km
     
-    if distance_km < 5:
-        window = "15–25 min"
-    elif distance_km < 15:
-        window = "30–45 min"
-    else:
-        window = "45–60 min"
+    window = ETA_WINDOWS[bisect.bisect_right(ETA_THRESHOLDS_KM, distance_km)]
     
     # Check if it's scheduled vs now
     timing = eta_request.timing
@@ -1182,9 +1432,34 @@ async def get_eta_preview(eta_request: ETARequest):
     
     return ETAResponse(
         window=window,
-        distanceKm=min(distance_km, 25.0)  # Cap at 25km for realism
+        distanceKm=min(distance_km, ETA_MAX_DISTANCE_KM)  # Cap at 25km for realism
     )
 
+@api_router.post("/eta/preview/batch", response_model=ETABatchResponse)
+async def get_eta_preview_batch(eta_request: ETABatchRequest):
+    """Mock ETA calculation for several coordinates at once"""
+    if len(eta_request.lats) != len(eta_request.lngs):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="lats and lngs must be the same length"
+        )
+    
+    lats = np.asarray(eta_request.lats, dtype=np.float64)
+    lngs = np.asarray(eta_request.lngs, dtype=np.float64)
+    distances_km = np.round((np.abs(lats - ETA_ORIGIN_LAT) + np.abs(lngs - ETA_ORIGIN_LNG)) * 100, 1)
+    window_indexes = np.digitize(distances_km, ETA_THRESHOLDS_KM)
+    
+    prefix = "Scheduled: " if eta_request.timing.get("when") == "schedule" else ""
+    previews = [
+        ETAResponse.model_construct(window=f"{prefix}{ETA_WINDOWS[window_index]}", distanceKm=distance_km)
+        for window_index, distance_km in zip(
+            window_indexes.tolist(),
+            np.minimum(distances_km, ETA_MAX_DISTANCE_KM).tolist()
+        )
+    ]
+    
+    return ETABatchResponse.model_construct(previews=previews)
+
 # Payment & Billing Models
 class PaymentMethod(BaseModel):
     id: str
@@ -1247,6 +1522,9 @@ class BookingRequest(BaseModel):
     applyCredits: bool = False
     promoCode: Optional[str] = None
 
+# BookingRequest fields stored on the booking document as-is
+BOOKING_DOC_FIELDS = frozenset(("service", "address", "access", "totals", "payment"))
+
 class BookingResponse(BaseModel):
     bookingId: str
     status: str
@@ -1289,7 +1567,8 @@ async def create_setup_intent(current_user: User = Depends(get_current_user)):
     """Create Stripe setup intent for adding new payment method"""
     
     # Mock setup intent
-    mock_client_secret = f"seti_{secrets.token_urlsafe(24)}_secret_{secrets.token_urlsafe(16)}"
+    setup_token, secret_token = urlsafe_token_pair(24, 16)
+    mock_client_secret = f"seti_{setup_token}_secret_{secret_token}"
     
     return SetupIntentResponse(clientSecret=mock_client_secret)
 
@@ -1303,45 +1582,24 @@ async def attach_payment_method(
     # Mock successful attachment
     return AttachPaymentMethodResponse(ok=True)
 
-@api_router.post("/pricing/promo/apply", response_model=PromoApplyResponse)
-async def apply_promo_code(
-    request: PromoApplyRequest,
-    current_user: User = Depends(get_current_user)
-):
-    """Apply promo code and calculate pricing breakdown"""
-    
-    # Mock pricing calculation
+# Mock promo codes -> flat discount
+PROMO_DISCOUNTS = MappingProxyType({"SHINE20": 20.0, "FIRST10": 10.0, "SAVE15": 15.0})
+
+@lru_cache(maxsize=32)
+def compute_promo_breakdown(code: str, use_credits: bool) -> PromoApplyResponse:
+    """Mock promo pricing; pure in (code, use_credits), so responses are shared"""
     base_price = 89.00
     rooms_fee = 15.00
     surge_multiplier = 1.0
     
-    # Simulate promo code validation
-    valid_promos = ["SHINE20", "FIRST10", "SAVE15"]
-    promo_applied = False
-    discount = 0.0
-    
-    if request.code in valid_promos:
-        promo_applied = True
-        if request.code == "SHINE20":
-            discount = 20.0
-        elif request.code == "FIRST10":
-            discount = 10.0
-        elif request.code == "SAVE15":
-            discount = 15.0
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid promo code"
-        )
-    
     # Calculate totals
     subtotal = base_price + rooms_fee
     surge_amount = subtotal * (surge_multiplier - 1) if surge_multiplier > 1 else 0
-    promo_discount = discount if promo_applied else 0
+    promo_discount = PROMO_DISCOUNTS[code]
     
     # Mock credits
     credits_available = 25.0
-    credits_applied = min(credits_available, subtotal) if request.useCredits else 0
+    credits_applied = min(credits_available, subtotal) if use_credits else 0
     
     tax_rate = 0.08875  # Mock tax rate
     taxable_amount = subtotal + surge_amount - promo_discount - credits_applied
@@ -1357,7 +1615,7 @@ async def apply_promo_code(
         breakdown.append(PriceBreakdownItem(label="Surge", amount=surge_amount))
     
     if promo_discount > 0:
-        breakdown.append(PriceBreakdownItem(label=f"Promo ({request.code})", amount=-promo_discount))
+        breakdown.append(PriceBreakdownItem(label=f"Promo ({code})", amount=-promo_discount))
     
     if credits_applied > 0:
         breakdown.append(PriceBreakdownItem(label="Credits", amount=-credits_applied))
@@ -1370,10 +1628,24 @@ async def apply_promo_code(
     return PromoApplyResponse(
         breakdown=breakdown,
         total=total,
-        promoApplied=promo_applied,
+        promoApplied=True,
         creditsApplied=credits_applied
     )
 
+@api_router.post("/pricing/promo/apply", response_model=PromoApplyResponse)
+async def apply_promo_code(
+    request: PromoApplyRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Apply promo code and calculate pricing breakdown"""
+    if request.code not in PROMO_DISCOUNTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid promo code"
+        )
+    
+    return compute_promo_breakdown(request.code, request.useCredits)
+
 @api_router.post("/billing/preauth", response_model=PaymentIntentResponse)
 async def create_payment_intent_preauth(
     request: PaymentIntentRequest,
@@ -1382,8 +1654,9 @@ async def create_payment_intent_preauth(
     """Create payment intent for pre-authorization"""
     
     # Mock payment intent creation
-    mock_pi_id = f"pi_{secrets.token_urlsafe(24)}"
-    mock_client_secret = f"{mock_pi_id}_secret_{secrets.token_urlsafe(16)}"
+    intent_token, secret_token = urlsafe_token_pair(24, 16)
+    mock_pi_id = f"pi_{intent_token}"
+    mock_client_secret = f"{mock_pi_id}_secret_{secret_token}"
     
     # Simulate different scenarios based on payment method
     requires_action = False
@@ -1416,7 +1689,7 @@ async def create_booking(
     """Create a booking after successful payment pre-auth"""
     
     # Simulate booking creation
-    booking_id = f"bk_{secrets.token_urlsafe(16)}"
+    booking_id = f"bk_{urlsafe_token(16)}"
     
     # Mock different booking statuses
     timing = booking_data.service.get("timing", {})
@@ -1430,25 +1703,31 @@ async def create_booking(
         next_step = "tracking"
     
     # Store booking in database
-    booking_doc = {
-        "booking_id": booking_id,
-        "user_id": current_user.id,
-        "status": status,
-        "service": booking_data.service,
-        "address": booking_data.address,
-        "access": booking_data.access,
-        "totals": booking_data.totals,
-        "payment": booking_data.payment,
-        "promo_code": booking_data.promoCode,
-        "credits_applied": booking_data.applyCredits,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
-    }
-    
-    await db.bookings.insert_one(booking_doc)
+    now = datetime.utcnow()
+    booking_doc = booking_data.model_dump(include=BOOKING_DOC_FIELDS)
+    booking_doc.update(
+        booking_id=booking_id,
+        user_id=current_user.id,
+        status=status,
+        promo_code=booking_data.promoCode,
+        credits_applied=booking_data.applyCredits,
+        created_at=now,
+        updated_at=now
+    )
     
-    # Create dispatch offer for partners
-    create_dispatch_offer(booking_id, booking_data.service)
+    # Persist the booking and create the partner dispatch offer concurrently
+    inserted, offer = await asyncio.gather(
+        db.bookings.insert_one(booking_doc),
+        create_dispatch_offer(booking_id, booking_data.service),
+        return_exceptions=True
+    )
+    if isinstance(inserted, BaseException):
+        # Partners must not be able to accept an offer for a booking that was never stored
+        if not isinstance(offer, BaseException):
+            await discard_offer(offer)
+        raise inserted
+    if isinstance(offer, BaseException):
+        raise offer
     
     return BookingResponse(
         bookingId=booking_id,
@@ -1534,10 +1813,106 @@ class OwnerDispatchResponse(BaseModel):
     kpis: OwnerDispatchKPIs
     offers: List[OwnerDispatchOffer]
 
-# In-memory dispatch state (in production, use Redis)
+# Dispatch state lives in Redis when REDIS_URL is set so every worker sees the
+# same offers and statuses; these dicts are the single-process fallback
 active_offers = {}  # offerId -> offer_data
+claimed_offers = {}  # offerId -> partnerId that won the claim
 booking_status = {}  # bookingId -> status_data
-partner_connections = {}  # partner_id -> websocket_connection
+partner_connections = {}  # partner_id -> websocket_connection (always per-process)
+
+# Redis keys expire on their own; offer ids are also indexed in a sorted set
+# scored by creation time so the dashboard can list them without SCAN
+DISPATCH_OFFER_TTL_SECONDS = 600
+DISPATCH_STATUS_TTL_SECONDS = 86400
+DISPATCH_OFFER_INDEX_KEY = "dispatch:offers"
+# datetime fields of Redis-backed state records, restored on load
+STATE_DATETIME_FIELDS = ("startTime", "createdAt", "updatedAt", "acceptedAt", "declinedAt", "cancelledAt")
+
+def dispatch_offer_key(offer_id: str) -> str:
+    return f"dispatch:offer:{offer_id}"
+
+def dispatch_status_key(booking_id: str) -> str:
+    return f"dispatch:status:{booking_id}"
+
+def load_state_record(raw: bytes) -> dict:
+    """Decode a Redis state record, restoring its datetime fields"""
+    data = orjson.loads(raw)
+    for field in STATE_DATETIME_FIELDS:
+        if isinstance(data.get(field), str):
+            data[field] = datetime.fromisoformat(data[field])
+    return data
+
+async def get_offer(offer_id: str) -> Optional[dict]:
+    if redis_client is None:
+        return active_offers.get(offer_id)
+    raw = await redis_client.get(dispatch_offer_key(offer_id))
+    return load_state_record(raw) if raw else None
+
+async def save_offer(offer_data: dict, new: bool = False):
+    """Store an offer; new offers start their TTL, updates keep the remaining one"""
+    offer_id = offer_data["offerId"]
+    if redis_client is None:
+        active_offers[offer_id] = offer_data
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        if new:
+            pipe.set(dispatch_offer_key(offer_id), orjson.dumps(offer_data), ex=DISPATCH_OFFER_TTL_SECONDS)
+            pipe.zadd(DISPATCH_OFFER_INDEX_KEY, {offer_id: time.time()})
+        else:
+            pipe.set(dispatch_offer_key(offer_id), orjson.dumps(offer_data), xx=True, keepttl=True)
+        await pipe.execute()
+
+async def discard_offer(offer_data: dict):
+    """Remove an offer and its booking's dispatch status, e.g. when the booking was never stored"""
+    offer_id, booking_id = offer_data["offerId"], offer_data["bookingId"]
+    if redis_client is None:
+        active_offers.pop(offer_id, None)
+        claimed_offers.pop(offer_id, None)
+        booking_status.pop(booking_id, None)
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.delete(dispatch_offer_key(offer_id), f"{dispatch_offer_key(offer_id)}:claim", dispatch_status_key(booking_id))
+        pipe.zrem(DISPATCH_OFFER_INDEX_KEY, offer_id)
+        await pipe.execute()
+
+async def list_offers() -> List[dict]:
+    if redis_client is None:
+        return list(active_offers.values())
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zremrangebyscore(DISPATCH_OFFER_INDEX_KEY, "-inf", time.time() - DISPATCH_OFFER_TTL_SECONDS)
+        pipe.zrange(DISPATCH_OFFER_INDEX_KEY, 0, -1)
+        _, offer_ids = await pipe.execute()
+    if not offer_ids:
+        return []
+    raw_offers = await redis_client.mget([dispatch_offer_key(offer_id.decode()) for offer_id in offer_ids])
+    return [load_state_record(raw) for raw in raw_offers if raw]
+
+async def claim_offer(offer_id: str, partner_id: str) -> bool:
+    """Atomically claim an offer across workers; False if another partner won"""
+    if redis_client is None:
+        # Check-and-set with no await in between, mirroring SET NX below
+        if offer_id in claimed_offers:
+            return False
+        claimed_offers[offer_id] = partner_id
+        return True
+    return bool(await redis_client.set(
+        f"{dispatch_offer_key(offer_id)}:claim", partner_id, nx=True, ex=DISPATCH_OFFER_TTL_SECONDS
+    ))
+
+async def get_booking_status(booking_id: str) -> Optional[dict]:
+    if redis_client is None:
+        return booking_status.get(booking_id)
+    raw = await redis_client.get(dispatch_status_key(booking_id))
+    return load_state_record(raw) if raw else None
+
+async def save_booking_status(booking_id: str, status_data: dict):
+    if redis_client is None:
+        booking_status[booking_id] = status_data
+        return
+    await redis_client.set(dispatch_status_key(booking_id), orjson.dumps(status_data), ex=DISPATCH_STATUS_TTL_SECONDS)
+
+# Mock surge window for dispatch offers (UTC hours)
+DISPATCH_RUSH_HOURS = frozenset((7, 8, 17, 18, 19))
 
 # Dispatch API Endpoints
 @api_router.get("/dispatch/status/{booking_id}", response_model=CustomerStatusResponse)
@@ -1548,17 +1923,18 @@ async def get_customer_dispatch_status(
     """Get customer dispatch status for a booking"""
     
     # Mock dispatch status based on booking_id
-    if booking_id not in booking_status:
+    status = await get_booking_status(booking_id)
+    if status is None:
         # Initialize new booking dispatch
-        booking_status[booking_id] = {
+        status = {
             "state": "searching",
             "waitMins": 3,
             "zone": "downtown_sf",
             "startTime": datetime.utcnow(),
             "partner": None
         }
-    
-    status = booking_status[booking_id]
+        await save_booking_status(booking_id, status)
+    previous_state = status["state"]
     
     # Simulate progression over time
     elapsed_mins = (datetime.utcnow() - status["startTime"]).total_seconds() / 60
@@ -1577,6 +1953,9 @@ async def get_customer_dispatch_status(
         if status["state"] == "searching":
             status["state"] = "no_match"
     
+    if status["state"] != previous_state:
+        await save_booking_status(booking_id, status)
+    
     return CustomerStatusResponse(
         state=status["state"],
         waitMins=max(1, int(status["waitMins"] - elapsed_mins)),
@@ -1585,41 +1964,30 @@ async def get_customer_dispatch_status(
     )
 
 @api_router.get("/partner/offers/poll")
-async def poll_partner_offers(current_user: User = Depends(get_current_user)):
+async def poll_partner_offers(current_user: User = Depends(require_role("partner"))):
     """Polling fallback for partner offers"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    # Check for active offers for this partner
-    partner_offers = [
-        offer for offer in active_offers.values() 
-        if offer.get("targetPartnerId") == current_user.id
-    ]
-    
-    if partner_offers:
-        offer_data = partner_offers[0]  # Return first offer
-        return {"offer": offer_data}
+    # Return the first active offer for this partner, stopping at the match
+    offer_data = next(
+        (offer for offer in await list_offers() if offer.get("targetPartnerId") == current_user.id),
+        None
+    )
     
-    return {"offer": None}
+    return {"offer": offer_data}
 
 @api_router.post("/partner/offers/{offer_id}/accept", response_model=AcceptOfferResponse)
 async def accept_offer(
     offer_id: str,
     request: AcceptOfferRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Accept a partner offer"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     # Check if offer exists and is still valid
-    if offer_id not in active_offers:
+    offer = await get_offer(offer_id)
+    if offer is None:
         raise HTTPException(status_code=410, detail="Offer expired")
     
-    offer = active_offers[offer_id]
-    
     # Check if already taken by another partner
     if offer.get("status") == "accepted":
         raise HTTPException(status_code=409, detail="Offer already taken")
@@ -1628,25 +1996,38 @@ async def accept_offer(
     if current_user.partner_status != "verified":
         raise HTTPException(status_code=423, detail="Partner not eligible")
     
+    # Another worker may have accepted the same offer since it was read; claim
+    # it while the booking status is fetched
+    booking_id = offer["bookingId"]
+    claimed, status = await asyncio.gather(
+        claim_offer(offer_id, current_user.id),
+        get_booking_status(booking_id)
+    )
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Offer already taken")
+    
     # Accept the offer
     offer["status"] = "accepted"
     offer["acceptedBy"] = current_user.id
     offer["acceptedAt"] = datetime.utcnow()
     
+    # Store idempotency key to prevent double accepts
+    offer["idempotencyKey"] = request.idempotencyKey
+    writes = [save_offer(offer)]
+    
     # Update booking status
-    booking_id = offer["bookingId"]
-    if booking_id in booking_status:
-        booking_status[booking_id]["state"] = "assigned"
-        booking_status[booking_id]["partner"] = {
+    if status is not None:
+        status["state"] = "assigned"
+        status["partner"] = {
             "id": current_user.id,
-            "name": f"{current_user.email.split('@')[0]} P.",
+            "name": current_user.partner_display_name,
             "rating": 4.7,
             "etaMinutes": offer["etaMinutes"],
             "distanceKm": offer["distanceKm"]
         }
+        writes.append(save_booking_status(booking_id, status))
     
-    # Store idempotency key to prevent double accepts
-    offer["idempotencyKey"] = request.idempotencyKey
+    await asyncio.gather(*writes)
     
     return AcceptOfferResponse(
         assigned=True,
@@ -1656,18 +2037,17 @@ async def accept_offer(
 @api_router.post("/partner/offers/{offer_id}/decline", response_model=DeclineOfferResponse)
 async def decline_offer(
     offer_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Decline a partner offer"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     # Mark offer as declined
-    if offer_id in active_offers:
-        active_offers[offer_id]["status"] = "declined"
-        active_offers[offer_id]["declinedBy"] = current_user.id
-        active_offers[offer_id]["declinedAt"] = datetime.utcnow()
+    offer = await get_offer(offer_id)
+    if offer is not None:
+        offer["status"] = "declined"
+        offer["declinedBy"] = current_user.id
+        offer["declinedAt"] = datetime.utcnow()
+        await save_offer(offer)
     
     return DeclineOfferResponse(ok=True)
 
@@ -1675,19 +2055,15 @@ async def decline_offer(
 async def cancel_booking(
     booking_id: str,
     request: CustomerCancelRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("customer"))
 ):
     """Cancel a customer booking"""
     
-    if current_user.role != "customer":
-        raise HTTPException(status_code=403, detail="Customer access required")
-    
     # Check booking status
-    if booking_id not in booking_status:
+    status = await get_booking_status(booking_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Booking not found")
     
-    status = booking_status[booking_id]
-    
     # Check if can cancel
     if status["state"] == "assigned":
         raise HTTPException(status_code=409, detail="Cannot cancel after partner accepted")
@@ -1709,6 +2085,7 @@ async def cancel_booking(
     status["state"] = "cancelled"
     status["cancelReason"] = request.reason
     status["cancelledAt"] = datetime.utcnow()
+    await save_booking_status(booking_id, status)
     
     return CustomerCancelResponse(
         ok=True,
@@ -1717,16 +2094,27 @@ async def cancel_booking(
     )
 
 @api_router.get("/owner/dispatch", response_model=OwnerDispatchResponse)
-async def get_owner_dispatch_dashboard(current_user: User = Depends(get_current_user)):
+async def get_owner_dispatch_dashboard(current_user: User = Depends(require_role("owner"))):
     """Get owner dispatch dashboard with live metrics"""
     
-    if current_user.role != "owner":
-        raise HTTPException(status_code=403, detail="Owner access required")
-    
-    # Calculate KPIs from active data
-    total_offers = len(active_offers)
-    accepted_offers = len([o for o in active_offers.values() if o.get("status") == "accepted"])
-    expired_offers = len([o for o in active_offers.values() if o.get("status") == "expired"])
+    # Calculate KPIs and format the offers table in a single pass
+    offers = await list_offers()
+    total_offers = len(offers)
+    accepted_offers = 0
+    expired_offers = 0
+    offers_list = []
+    for offer_data in offers:
+        offer_state = offer_data.get("status", "offered")
+        accepted_offers += offer_state == "accepted"
+        expired_offers += offer_state == "expired"
+        offers_list.append(OwnerDispatchOffer(
+            offerId=offer_data["offerId"],
+            bookingId=offer_data.get("bookingId", ""),
+            zone=offer_data.get("zone", "downtown_sf"),
+            state=offer_state,
+            pings=offer_data.get("pings", 1),
+            surge=offer_data.get("surge", {}).get("multiplier", 1.0)
+        ))
     
     accept_rate = (accepted_offers / max(1, total_offers)) * 100
     
@@ -1740,41 +2128,32 @@ async def get_owner_dispatch_dashboard(current_user: User = Depends(get_current_
         offersExpired=expired_offers
     )
     
-    # Format offers for table
-    offers_list = []
-    for offer_id, offer_data in active_offers.items():
-        offers_list.append(OwnerDispatchOffer(
-            offerId=offer_id,
-            bookingId=offer_data.get("bookingId", ""),
-            zone=offer_data.get("zone", "downtown_sf"),
-            state=offer_data.get("status", "offered"),
-            pings=offer_data.get("pings", 1),
-            surge=offer_data.get("surge", {}).get("multiplier", 1.0)
-        ))
-    
     return OwnerDispatchResponse(
         kpis=kpis,
         offers=offers_list
     )
 
 # Helper function to create mock offers (called when bookings are created)
-def create_dispatch_offer(booking_id: str, service_data: dict):
+async def create_dispatch_offer(booking_id: str, service_data: dict):
     """Create a new dispatch offer for partners"""
     
-    offer_id = f"of_{secrets.token_urlsafe(16)}"
+    offer_id = f"of_{urlsafe_token(16)}"
     
     # Mock surge based on time/demand
-    current_hour = datetime.utcnow().hour
-    surge_active = current_hour in [7, 8, 17, 18, 19]  # Rush hours
+    now = datetime.utcnow()
+    surge_active = now.hour in DISPATCH_RUSH_HOURS
     surge_multiplier = 1.5 if surge_active else 1.0
     
+    # Mock distance/ETA derived from one hash of the booking id
+    booking_hash = stable_hash(booking_id)
+    
     offer_data = {
         "offerId": offer_id,
         "bookingId": booking_id,
         "serviceType": service_data.get("serviceType", "basic"),
         "addressShort": "Downtown SF",  # Masked address
-        "distanceKm": round(2.0 + (hash(booking_id) % 5), 1),
-        "etaMinutes": 8 + (hash(booking_id) % 10),
+        "distanceKm": round(2.0 + (booking_hash % 5), 1),
+        "etaMinutes": 8 + (booking_hash % 10),
         "when": service_data.get("timing", {}).get("when", "now"),
         "scheduleAt": service_data.get("timing", {}).get("scheduleAt"),
         "payout": 45.0 * surge_multiplier,
@@ -1785,21 +2164,21 @@ def create_dispatch_offer(booking_id: str, service_data: dict):
         },
         "countdownSec": 25,
         "status": "offered",
-        "createdAt": datetime.utcnow(),
+        "createdAt": now,
         "zone": "downtown_sf",
         "pings": 1
     }
     
-    active_offers[offer_id] = offer_data
+    await save_offer(offer_data, new=True)
     
     # Initialize booking status for customer tracking
-    booking_status[booking_id] = {
+    await save_booking_status(booking_id, {
         "state": "searching",
         "waitMins": 5,
         "zone": "downtown_sf",
-        "startTime": datetime.utcnow(),
+        "startTime": now,
         "partner": None
-    }
+    })
     
     return offer_data
 
@@ -1904,6 +2283,7 @@ class ChatMessage(BaseModel):
 
 class ChatResponse(BaseModel):
     messages: List[ChatMessage]
+    cursor: Optional[str] = None  # pass back as ?since= for the next page
 
 class CaptureRequest(BaseModel):
     paymentIntentId: str
@@ -1918,10 +2298,230 @@ class SOSRequest(BaseModel):
     lng: float
     role: str  # customer|partner
 
-# In-memory job state (in production, use Redis/database)
+# Job state lives in Redis when REDIS_URL is set (shared across workers and
+# restarts); these dicts are the single-process fallback
 job_states = {}  # bookingId -> job_data
 job_photos = {}  # bookingId -> {before: [], after: []}
-job_chat = {}  # bookingId -> [messages]
+job_chat = {}  # bookingId -> deque of (sequence, message)
+
+# Local job event subscribers for the single-process fallback (Redis pub/sub
+# carries events across workers otherwise)
+job_listeners = defaultdict(set)  # bookingId -> {asyncio.Queue}
+
+# Striped locks serialising read-modify-write of job state within this
+# process: a fixed pool keyed by booking id, so nothing grows or needs
+# evicting. A handler never holds more than one, so stripes cannot deadlock
+JOB_LOCK_STRIPES = 256
+job_lock_stripes = tuple(asyncio.Lock() for _ in range(JOB_LOCK_STRIPES))
+
+def job_lock(booking_id: str) -> asyncio.Lock:
+    return job_lock_stripes[stable_hash(booking_id) % JOB_LOCK_STRIPES]
+
+# Job keys expire a week after their last write
+JOB_STATE_TTL_SECONDS = 7 * 86400
+JOB_PHOTO_TYPES = ("before", "after")
+
+def job_state_key(booking_id: str) -> str:
+    return f"job:{booking_id}"
+
+def job_photos_key(booking_id: str, photo_type: str) -> str:
+    return f"job:{booking_id}:photos:{photo_type}"
+
+def job_chat_key(booking_id: str) -> str:
+    return f"job:{booking_id}:chat"
+
+def job_events_channel(booking_id: str) -> str:
+    return f"job:{booking_id}"
+
+def encode_job_event(job_data: dict) -> bytes:
+    """The live-tracking view of a job pushed to websocket subscribers"""
+    return orjson.dumps({
+        "bookingId": job_data["bookingId"],
+        "status": job_data["status"],
+        "etaMinutes": job_data.get("etaMinutes"),
+        "partnerLocation": job_data.get("partnerLocation"),
+        "updatedAt": job_data.get("updatedAt")
+    })
+
+async def get_job_state(booking_id: str) -> Optional[dict]:
+    if redis_client is None:
+        return job_states.get(booking_id)
+    raw = await redis_client.get(job_state_key(booking_id))
+    return load_state_record(raw) if raw else None
+
+async def save_job_state(booking_id: str, job_data: dict):
+    """Persist job state and publish it to the job's live subscribers"""
+    event = encode_job_event(job_data)
+    if redis_client is None:
+        job_states[booking_id] = job_data
+        for listener in job_listeners.get(booking_id, ()):
+            listener.put_nowait(event)
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.set(job_state_key(booking_id), orjson.dumps(job_data), ex=JOB_STATE_TTL_SECONDS)
+        pipe.publish(job_events_channel(booking_id), event)
+        await pipe.execute()
+
+@asynccontextmanager
+async def subscribe_job_events(booking_id: str):
+    """Yield an awaitable returning the job's next published event"""
+    if redis_client is None:
+        listener = asyncio.Queue()
+        job_listeners[booking_id].add(listener)
+        try:
+            yield listener.get
+        finally:
+            job_listeners[booking_id].discard(listener)
+            if not job_listeners[booking_id]:
+                del job_listeners[booking_id]
+        return
+    
+    pubsub = redis_client.pubsub()
+    await pubsub.subscribe(job_events_channel(booking_id))
+    
+    async def next_event() -> bytes:
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            if message is not None:
+                return message["data"]
+    
+    try:
+        yield next_event
+    finally:
+        await pubsub.reset()
+
+async def get_job_photos(booking_id: str) -> dict:
+    """Photo file ids by type: {before: [...], after: [...]}"""
+    if redis_client is None:
+        return job_photos.get(booking_id, {"before": [], "after": []})
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for photo_type in JOB_PHOTO_TYPES:
+            pipe.lrange(job_photos_key(booking_id, photo_type), 0, -1)
+        before, after = await pipe.execute()
+    return {"before": [file_id.decode() for file_id in before], "after": [file_id.decode() for file_id in after]}
+
+async def add_job_photos(booking_id: str, photo_type: str, file_ids: List[str]) -> dict:
+    """Append photo file ids and return the photo counts by type"""
+    if redis_client is None:
+        photos = job_photos.setdefault(booking_id, {"before": [], "after": []})
+        if photo_type in photos:
+            photos[photo_type].extend(file_ids)
+        return {kind: len(photos[kind]) for kind in JOB_PHOTO_TYPES}
+    async with redis_client.pipeline(transaction=False) as pipe:
+        if photo_type in JOB_PHOTO_TYPES and file_ids:
+            pipe.rpush(job_photos_key(booking_id, photo_type), *file_ids)
+            pipe.expire(job_photos_key(booking_id, photo_type), JOB_STATE_TTL_SECONDS)
+        for kind in JOB_PHOTO_TYPES:
+            pipe.llen(job_photos_key(booking_id, kind))
+        results = await pipe.execute()
+    return dict(zip(JOB_PHOTO_TYPES, results[-len(JOB_PHOTO_TYPES):]))
+
+# Chat is a Redis stream capped near CHAT_MAX_MESSAGES per job, read a page at
+# a time after a stream-id cursor ("<ms>-<seq>"; the fallback uses "<n>-0")
+CHAT_MAX_MESSAGES = 1000
+CHAT_PAGE_SIZE = 100
+CHAT_CURSOR_PATTERN = re.compile(r"\d+-\d+")
+
+async def get_job_chat(booking_id: str, since: Optional[str] = None) -> tuple[List[dict], Optional[str]]:
+    """Up to CHAT_PAGE_SIZE messages after `since`, and the cursor of the last one"""
+    if redis_client is None:
+        after = int(since.split("-", 1)[0]) if since else 0
+        page = list(itertools.islice(
+            ((sequence, message) for sequence, message in job_chat.get(booking_id, ()) if sequence > after),
+            CHAT_PAGE_SIZE
+        ))
+        cursor = f"{page[-1][0]}-0" if page else since
+        return [message for _, message in page], cursor
+    
+    entries = await redis_client.xrange(job_chat_key(booking_id), min=f"({since}" if since else "-", count=CHAT_PAGE_SIZE)
+    messages = [{field.decode(): value.decode() for field, value in fields.items()} for _, fields in entries]
+    return messages, entries[-1][0].decode() if entries else since
+
+async def append_job_chat(booking_id: str, message: dict):
+    if redis_client is None:
+        messages = job_chat.setdefault(booking_id, deque(maxlen=CHAT_MAX_MESSAGES))
+        messages.append((messages[-1][0] + 1 if messages else 1, message))
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.xadd(job_chat_key(booking_id), message, maxlen=CHAT_MAX_MESSAGES, approximate=True)
+        pipe.expire(job_chat_key(booking_id), JOB_STATE_TTL_SECONDS)
+        await pipe.execute()
+
+# Job state transitions: name -> (new status, timestamp field). The partner
+# drives every transition except the customer's approval
+JOB_TRANSITIONS = {
+    "arrive": ("arrived", "arrivedAt"),
+    "start": ("in_progress", "startedAt"),
+    "pause": ("paused", "pausedAt"),
+    "resume": ("in_progress", "resumedAt"),
+    "complete": ("awaiting_customer_review", "completedAt"),
+    "approve": ("completed", "approvedAt"),
+}
+
+async def get_transition_job(booking_id: str) -> dict:
+    """Return the job state for a state transition, or 404"""
+    job_data = await get_job_state(booking_id)
+    if job_data is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job_data
+
+# Job status replies are constant per status, so serialize each one once.
+# Only the bytes are shared; middleware may edit a Response's headers in place
+JOB_STATUSES = ("enroute", "arrived", "verifying_start", "in_progress", "paused", "awaiting_customer_review", "completed", "disputed")
+JOB_STATUS_BODIES = {job_status: orjson.dumps({"ok": True, "status": job_status}) for job_status in JOB_STATUSES}
+
+def job_status_response(job_status: str) -> Response:
+    """JobStatusResponse(ok=True, status=job_status) from prebuilt bytes"""
+    body = JOB_STATUS_BODIES.get(job_status) or orjson.dumps({"ok": True, "status": job_status})
+    return Response(content=body, media_type="application/json")
+
+# Handlers below return Response objects for their fixed-shape, internally
+# built replies: FastAPI then skips re-validating them against response_model,
+# which still documents the schema
+OK_BODY = orjson.dumps({"ok": True})
+
+def ok_response() -> Response:
+    return Response(content=OK_BODY, media_type="application/json")
+
+async def apply_job_transition(job_data: dict, transition: str, extra_fields: Optional[dict] = None) -> str:
+    """Apply and persist a state transition to job state and return the new status"""
+    new_status, timestamp_field = JOB_TRANSITIONS[transition]
+    now = datetime.utcnow()
+    
+    job_data["status"] = new_status
+    job_data[timestamp_field] = now.isoformat()
+    if extra_fields:
+        job_data.update(extra_fields)
+    job_data["updatedAt"] = now
+    await save_job_state(job_data["bookingId"], job_data)
+    
+    return new_status
+
+# Booking documents for the polled job and rating screens. Bookings are never
+# updated in place (only the mock seed replaces its own), and misses are not
+# cached, so a TTL is enough to keep them fresh. Callers must not mutate them
+BOOKING_CACHE_MAX_SIZE = 10000
+BOOKING_CACHE_TTL_SECONDS = 60
+booking_cache = TTLCache(maxsize=BOOKING_CACHE_MAX_SIZE, ttl=BOOKING_CACHE_TTL_SECONDS)
+booking_fetches = {}  # bookingId -> in-flight find_one shared by concurrent misses
+
+async def get_cached_booking(booking_id: str) -> Optional[dict]:
+    booking = booking_cache.get(booking_id)
+    if booking is not None:
+        return booking
+    
+    fetch = booking_fetches.get(booking_id)
+    if fetch is None:
+        fetch = asyncio.ensure_future(db.bookings.find_one({"booking_id": booking_id}))
+        booking_fetches[booking_id] = fetch
+        fetch.add_done_callback(lambda _: booking_fetches.pop(booking_id, None))
+    
+    # Shielded so one cancelled caller does not cancel the fetch for the others
+    booking = await asyncio.shield(fetch)
+    if booking is not None:
+        booking_cache[booking_id] = booking
+    return booking
 
 # Job & Tracking API Endpoints
 @api_router.get("/jobs/{booking_id}", response_model=JobResponse)
@@ -1932,9 +2532,10 @@ async def get_job(
     """Get job details and current status"""
     
     # Initialize job if not exists (from booking)
-    if booking_id not in job_states:
+    job_data = await get_job_state(booking_id)
+    if job_data is None:
         # Get booking data
-        booking = await db.bookings.find_one({"booking_id": booking_id})
+        booking = await get_cached_booking(booking_id)
         if not booking:
             raise HTTPException(status_code=404, detail="Job not found")
         
@@ -1942,8 +2543,9 @@ async def get_job(
         service_data = booking.get("service", {})
         service_type = service_data.get("serviceType") or service_data.get("type", "basic")
         
-        # Initialize job state
-        job_states[booking_id] = {
+        # Initialize job state (photos and chat start empty)
+        now = datetime.utcnow()
+        job_data = {
             "bookingId": booking_id,
             "status": "enroute",
             "serviceType": service_type,
@@ -1963,15 +2565,17 @@ async def get_job(
                 "before": 2 if service_type in ["deep", "bathroom"] else 1,
                 "after": 2
             },
-            "createdAt": datetime.utcnow(),
-            "updatedAt": datetime.utcnow()
+            "createdAt": now,
+            "updatedAt": now
         }
         
-        # Initialize photo tracking
-        job_photos[booking_id] = {"before": [], "after": []}
-        job_chat[booking_id] = []
-    
-    job_data = job_states[booking_id]
+        # Another request may have initialised the job while the booking loaded
+        async with job_lock(booking_id):
+            existing = await get_job_state(booking_id)
+            if existing is None:
+                await save_job_state(booking_id, job_data)
+            else:
+                job_data = existing
     
     return JobResponse(
         bookingId=job_data["bookingId"],
@@ -1984,22 +2588,103 @@ async def get_job(
         requiredPhotos=job_data["requiredPhotos"]
     )
 
+# Partner GPS pings are buffered and written once per tick; only the latest
+# ping per booking within a tick survives
+LOCATION_FLUSH_INTERVAL_SECONDS = 1.0
+location_buffer = {}  # bookingId -> latest partnerLocation since the last flush
+
+async def flush_location_updates():
+    """Apply buffered partner locations to job state and advance the ETA"""
+    global location_buffer
+    pending, location_buffer = location_buffer, {}
+    now = datetime.utcnow()
+    
+    for booking_id, location in pending.items():
+        async with job_lock(booking_id):
+            job_data = await get_job_state(booking_id)
+            if job_data is None:
+                continue
+            job_data["partnerLocation"] = location
+            
+            # Update ETA based on distance (mock calculation)
+            job_data["etaMinutes"] = max(1, job_data["etaMinutes"] - 1)
+            job_data["updatedAt"] = now
+            await save_job_state(booking_id, job_data)
+
+async def run_location_flusher():
+    while True:
+        await asyncio.sleep(LOCATION_FLUSH_INTERVAL_SECONDS)
+        try:
+            await flush_location_updates()
+        except Exception:
+            logger.exception("Location flush failed")
+
+@api_router.websocket("/ws/jobs/{booking_id}")
+async def job_events_socket(websocket: WebSocket, booking_id: str, token: str = Query(...)):
+    """Push job status, ETA and partner location to the client on every change"""
+    
+    # Browsers cannot set headers on websockets, so the bearer token is a query param
+    try:
+        current_user = await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    # The stream carries the partner's live location, so only the booking's
+    # customer, its assigned partner or an owner may follow it
+    booking = await get_cached_booking(booking_id)
+    if booking is None or not (
+        (current_user.role == "customer" and booking.get("user_id") == current_user.id)
+        or (current_user.role == "partner" and booking.get("partner_id") == current_user.id)
+        or current_user.role == "owner"
+    ):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    async with subscribe_job_events(booking_id) as next_event:
+        # Subscribed before the snapshot so no change between the two is lost
+        job_data = await get_job_state(booking_id)
+        if job_data is not None:
+            await websocket.send_bytes(encode_job_event(job_data))
+        
+        async def forward_events():
+            while True:
+                await websocket.send_bytes(await next_event())
+        
+        async def wait_for_disconnect():
+            # Clients only listen; receiving just detects the disconnect
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        
+        forwarder = asyncio.create_task(forward_events())
+        receiver = asyncio.create_task(wait_for_disconnect())
+        try:
+            done, _ = await asyncio.wait((forwarder, receiver), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            forwarder.cancel()
+            receiver.cancel()
+        
+        # The forwarder only stops on its own when reading or sending an event
+        # failed; close rather than leave the client on a socket with no updates
+        if forwarder in done and receiver not in done:
+            logger.error("Job event stream for %s failed", booking_id, exc_info=forwarder.exception())
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+
 @api_router.post("/jobs/{booking_id}/location", response_model=JobStatusResponse)
 async def update_location(
     booking_id: str,
     request: LocationUpdateRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Update partner location (for real-time tracking)"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    if booking_id not in job_states:
+    job_data = await get_job_state(booking_id)
+    if job_data is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job_data = job_states[booking_id]
-    job_data["partnerLocation"] = {
+    # Written to job state by the location flusher
+    location_buffer[booking_id] = {
         "lat": request.lat,
         "lng": request.lng,
         "heading": request.heading,
@@ -2007,97 +2692,83 @@ async def update_location(
         "timestamp": datetime.utcnow().isoformat()
     }
     
-    # Update ETA based on distance (mock calculation)
-    job_data["etaMinutes"] = max(1, job_data["etaMinutes"] - 1)
-    job_data["updatedAt"] = datetime.utcnow()
-    
-    return JobStatusResponse(ok=True, status=job_data["status"])
+    return job_status_response(job_data["status"])
 
 @api_router.post("/jobs/{booking_id}/arrived", response_model=JobStatusResponse)
 async def mark_arrived(
     booking_id: str,
     request: ArrivedRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Mark partner as arrived at job location"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    if booking_id not in job_states:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    job_data = job_states[booking_id]
-    job_data["status"] = "arrived"
-    job_data["arrivedAt"] = request.timestamp
-    job_data["updatedAt"] = datetime.utcnow()
+    async with job_lock(booking_id):
+        job_data = await get_transition_job(booking_id)
+        new_status = await apply_job_transition(job_data, "arrive", {"arrivedAt": request.timestamp})
     
-    return JobStatusResponse(ok=True, status="arrived")
+    return job_status_response(new_status)
 
 @api_router.post("/jobs/{booking_id}/verify/start", response_model=StartVerificationResponse)
 async def start_verification(
     booking_id: str,
     request: StartVerificationRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Start partner verification (face/biometric)"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    if booking_id not in job_states:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
     # Mock verification session
-    session_id = f"vs_{secrets.token_urlsafe(16)}"
+    session_id = f"vs_{urlsafe_token(16)}"
     expires_at = (datetime.utcnow() + timedelta(minutes=10)).isoformat()
     
-    job_data = job_states[booking_id]
-    job_data["verificationSession"] = {
-        "sessionId": session_id,
-        "method": request.method,
-        "expiresAt": expires_at,
-        "status": "pending"
-    }
+    async with job_lock(booking_id):
+        job_data = await get_job_state(booking_id)
+        if job_data is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        job_data["verificationSession"] = {
+            "sessionId": session_id,
+            "method": request.method,
+            "expiresAt": expires_at,
+            "status": "pending"
+        }
+        await save_job_state(booking_id, job_data)
     
-    return StartVerificationResponse(
-        sessionId=session_id,
-        expiresAt=expires_at
-    )
+    return ORJSONResponse({"sessionId": session_id, "expiresAt": expires_at})
 
 @api_router.post("/jobs/{booking_id}/verify/complete", response_model=CompleteVerificationResponse)
 async def complete_verification(
     booking_id: str,
     request: CompleteVerificationRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Complete partner verification"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    if booking_id not in job_states:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    job_data = job_states[booking_id]
-    verification = job_data.get("verificationSession", {})
-    
-    if verification.get("sessionId") != request.sessionId:
-        raise HTTPException(status_code=400, detail="Invalid session")
+    # Mock verification result (90% success rate, same outcome on retries)
+    verified = request.result == "success" and stable_hash(request.evidenceId) % 10 != 0
     
-    # Mock verification result (90% success rate)
-    verified = request.result == "success" and hash(request.evidenceId) % 10 != 0
-    
-    verification["status"] = "success" if verified else "failed"
-    verification["result"] = request.result
-    verification["evidenceId"] = request.evidenceId
-    verification["completedAt"] = datetime.utcnow().isoformat()
-    
-    if verified:
-        job_data["status"] = "verifying_start"
-        job_data["verified"] = True
+    async with job_lock(booking_id):
+        job_data = await get_job_state(booking_id)
+        if job_data is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        verification = job_data.get("verificationSession", {})
+        
+        if verification.get("sessionId") != request.sessionId:
+            raise HTTPException(status_code=400, detail="Invalid session")
+        
+        verification["status"] = "success" if verified else "failed"
+        verification["result"] = request.result
+        verification["evidenceId"] = request.evidenceId
+        now = datetime.utcnow()
+        verification["completedAt"] = now.isoformat()
+        
+        if verified:
+            job_data["status"] = "verifying_start"
+            job_data["verified"] = True
+        job_data["updatedAt"] = now
+        await save_job_state(booking_id, job_data)
     
-    return CompleteVerificationResponse(verified=verified)
+    return ORJSONResponse({"verified": verified})
 
 @api_router.post("/media/presign", response_model=PresignResponse)
 async def get_presigned_url(
@@ -2107,197 +2778,144 @@ async def get_presigned_url(
     """Get presigned URL for photo upload"""
     
     # Mock presigned URL (in production, use S3/GCS)
-    file_id = f"img_{secrets.token_urlsafe(16)}"
+    file_id = f"img_{urlsafe_token(16)}"
     upload_url = f"https://mock-storage.example.com/upload/{file_id}?signature=mock"
     
-    return PresignResponse(
-        uploadUrl=upload_url,
-        fileId=file_id
-    )
+    return ORJSONResponse({"uploadUrl": upload_url, "fileId": file_id})
 
 @api_router.post("/jobs/{booking_id}/photos", response_model=AddPhotosResponse)
 async def add_photos(
     booking_id: str,
     request: AddPhotosRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Add before/after photos to job"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    if booking_id not in job_photos:
-        job_photos[booking_id] = {"before": [], "after": []}
-    
-    photos = job_photos[booking_id]
-    
-    if request.type == "before":
-        photos["before"].extend(request.fileIds)
-    elif request.type == "after":
-        photos["after"].extend(request.fileIds)
+    counts = await add_job_photos(booking_id, request.type, request.fileIds)
     
     # Update job status based on photo requirements
-    job_data = job_states.get(booking_id, {})
-    required_before = job_data.get("requiredPhotos", {}).get("before", 1)
-    
-    if request.type == "before" and len(photos["before"]) >= required_before:
-        job_data["canStart"] = job_data.get("verified", False)
-    
-    return AddPhotosResponse(
-        ok=True,
-        counts={
-            "before": len(photos["before"]),
-            "after": len(photos["after"])
-        }
-    )
+    if request.type == "before":
+        async with job_lock(booking_id):
+            job_data = await get_job_state(booking_id)
+            if job_data is not None and counts["before"] >= job_data.get("requiredPhotos", {}).get("before", 1):
+                job_data["canStart"] = job_data.get("verified", False)
+                await save_job_state(booking_id, job_data)
+    
+    return ORJSONResponse({"ok": True, "counts": counts})
 
 @api_router.post("/jobs/{booking_id}/start", response_model=JobStatusResponse)
 async def start_job(
     booking_id: str,
     request: StartJobRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Start the job (after verification and photos)"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    if booking_id not in job_states:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    job_data = job_states[booking_id]
-    photos = job_photos.get(booking_id, {})
-    
     # Validate requirements
     if not request.verified:
         raise HTTPException(status_code=400, detail="Verification required")
     
-    required_before = job_data.get("requiredPhotos", {}).get("before", 1)
-    if len(photos.get("before", [])) < required_before:
-        raise HTTPException(status_code=400, detail=f"Minimum {required_before} before photos required")
+    photos = await get_job_photos(booking_id)
     
-    job_data["status"] = "in_progress"
-    job_data["startedAt"] = datetime.utcnow().isoformat()
-    job_data["updatedAt"] = datetime.utcnow()
+    async with job_lock(booking_id):
+        job_data = await get_transition_job(booking_id)
+        required_before = job_data.get("requiredPhotos", {}).get("before", 1)
+        if len(photos.get("before", [])) < required_before:
+            raise HTTPException(status_code=400, detail=f"Minimum {required_before} before photos required")
+        
+        new_status = await apply_job_transition(job_data, "start")
     
-    return JobStatusResponse(ok=True, status="in_progress")
+    return job_status_response(new_status)
 
 @api_router.post("/jobs/{booking_id}/pause", response_model=JobStatusResponse)
 async def pause_job(
     booking_id: str,
     request: PauseJobRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Pause the job with reason"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
+    async with job_lock(booking_id):
+        job_data = await get_transition_job(booking_id)
+        new_status = await apply_job_transition(job_data, "pause", {"pauseReason": request.reason})
     
-    if booking_id not in job_states:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    job_data = job_states[booking_id]
-    job_data["status"] = "paused"
-    job_data["pausedAt"] = datetime.utcnow().isoformat()
-    job_data["pauseReason"] = request.reason
-    job_data["updatedAt"] = datetime.utcnow()
-    
-    return JobStatusResponse(ok=True, status="paused")
+    return job_status_response(new_status)
 
 @api_router.post("/jobs/{booking_id}/resume", response_model=JobStatusResponse)
 async def resume_job(
     booking_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Resume paused job"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
+    async with job_lock(booking_id):
+        job_data = await get_transition_job(booking_id)
+        new_status = await apply_job_transition(job_data, "resume")
     
-    if booking_id not in job_states:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    job_data = job_states[booking_id]
-    job_data["status"] = "in_progress"
-    job_data["resumedAt"] = datetime.utcnow().isoformat()
-    job_data["updatedAt"] = datetime.utcnow()
-    
-    return JobStatusResponse(ok=True, status="in_progress")
+    return job_status_response(new_status)
 
 @api_router.post("/jobs/{booking_id}/complete", response_model=JobStatusResponse)
 async def complete_job(
     booking_id: str,
     request: CompleteJobRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Complete the job (partner side)"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
+    photos = await get_job_photos(booking_id)
     
-    if booking_id not in job_states:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    job_data = job_states[booking_id]
-    photos = job_photos.get(booking_id, {})
-    
-    # Validate after photos
-    required_after = job_data.get("requiredPhotos", {}).get("after", 2)
-    if len(photos.get("after", [])) < required_after:
-        raise HTTPException(status_code=400, detail=f"Minimum {required_after} after photos required")
-    
-    job_data["status"] = "awaiting_customer_review"
-    job_data["completedAt"] = datetime.utcnow().isoformat()
-    job_data["partnerNotes"] = request.notes
-    job_data["updatedAt"] = datetime.utcnow()
+    async with job_lock(booking_id):
+        job_data = await get_transition_job(booking_id)
+        
+        # Validate after photos
+        required_after = job_data.get("requiredPhotos", {}).get("after", 2)
+        if len(photos.get("after", [])) < required_after:
+            raise HTTPException(status_code=400, detail=f"Minimum {required_after} after photos required")
+        
+        new_status = await apply_job_transition(job_data, "complete", {"partnerNotes": request.notes})
     
-    return JobStatusResponse(ok=True, status="awaiting_customer_review")
+    return job_status_response(new_status)
 
 @api_router.post("/jobs/{booking_id}/approve", response_model=ApproveCompletionResponse)
 async def approve_completion(
     booking_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("customer"))
 ):
     """Customer approves job completion"""
     
-    if current_user.role != "customer":
-        raise HTTPException(status_code=403, detail="Customer access required")
-    
-    if booking_id not in job_states:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    job_data = job_states[booking_id]
-    job_data["status"] = "completed"
-    job_data["approvedAt"] = datetime.utcnow().isoformat()
-    job_data["updatedAt"] = datetime.utcnow()
+    async with job_lock(booking_id):
+        job_data = await get_transition_job(booking_id)
+        new_status = await apply_job_transition(job_data, "approve")
     
-    return ApproveCompletionResponse(ok=True, status="completed")
+    return job_status_response(new_status)
 
 @api_router.post("/jobs/{booking_id}/issue", response_model=RaiseIssueResponse)
 async def raise_issue(
     booking_id: str,
     request: RaiseIssueRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("customer"))
 ):
     """Customer raises an issue with job completion"""
     
-    if current_user.role != "customer":
-        raise HTTPException(status_code=403, detail="Customer access required")
-    
     # Create support ticket
-    ticket_id = f"sup_{secrets.token_urlsafe(16)}"
+    ticket_id = f"sup_{urlsafe_token(16)}"
     
     # Store issue data
-    job_data = job_states.get(booking_id, {})
-    job_data["issue"] = {
-        "ticketId": ticket_id,
-        "reason": request.reason,
-        "photoIds": request.photoIds,
-        "reportedAt": datetime.utcnow().isoformat()
-    }
-    job_data["status"] = "disputed"
+    async with job_lock(booking_id):
+        job_data = await get_job_state(booking_id)
+        if job_data is not None:
+            now = datetime.utcnow()
+            job_data["issue"] = {
+                "ticketId": ticket_id,
+                "reason": request.reason,
+                "photoIds": request.photoIds,
+                "reportedAt": now.isoformat()
+            }
+            job_data["status"] = "disputed"
+            job_data["updatedAt"] = now
+            await save_job_state(booking_id, job_data)
     
-    return RaiseIssueResponse(ok=True, ticketId=ticket_id)
+    return ORJSONResponse({"ok": True, "ticketId": ticket_id})
 
 # Communication APIs (Mock implementations)
 @api_router.post("/comm/call", response_model=MaskedCallResponse)
@@ -2307,31 +2925,26 @@ async def initiate_masked_call(
 ):
     """Initiate masked call between customer and partner"""
     
-    call_id = f"call_{secrets.token_urlsafe(16)}"
+    call_id = f"call_{urlsafe_token(16)}"
     proxy_number = "+1-555-0123"  # Mock proxy number
     
-    return MaskedCallResponse(
-        callId=call_id,
-        proxyNumber=proxy_number
-    )
+    return ORJSONResponse({"callId": call_id, "proxyNumber": proxy_number})
 
 @api_router.get("/comm/chat/{booking_id}", response_model=ChatResponse)
 async def get_chat_messages(
     booking_id: str,
+    since: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user)
 ):
-    """Get chat messages for a job"""
+    """Get chat messages for a job, oldest first, a page at a time"""
     
-    messages = job_chat.get(booking_id, [])
+    if since is not None and not CHAT_CURSOR_PATTERN.fullmatch(since):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    return ChatResponse(messages=[
-        ChatMessage(
-            id=msg["id"],
-            **{"from": msg["from"]},
-            text=msg["text"],
-            timestamp=msg["timestamp"]
-        ) for msg in messages
-    ])
+    messages, cursor = await get_job_chat(booking_id, since)
+    
+    # Stored messages already carry exactly the ChatMessage keys
+    return ORJSONResponse({"messages": messages, "cursor": cursor})
 
 @api_router.post("/comm/chat/{booking_id}")
 async def send_chat_message(
@@ -2341,17 +2954,14 @@ async def send_chat_message(
 ):
     """Send chat message"""
     
-    if booking_id not in job_chat:
-        job_chat[booking_id] = []
-    
     message = {
-        "id": f"msg_{secrets.token_urlsafe(8)}",
+        "id": f"msg_{urlsafe_token(8)}",
         "from": current_user.role,
         "text": message_data.get("text", ""),
         "timestamp": datetime.utcnow().isoformat()
     }
     
-    job_chat[booking_id].append(message)
+    await append_job_chat(booking_id, message)
     
     return {"ok": True, "messageId": message["id"]}
 
@@ -2361,14 +2971,14 @@ async def capture_at_start(request: CaptureRequest):
     """Capture payment at job start"""
     
     # Mock payment capture
-    return CaptureResponse(ok=True)
+    return ok_response()
 
 @api_router.post("/billing/capture/finish", response_model=CaptureResponse)
 async def capture_at_finish(request: CaptureRequest):
     """Capture final payment at job completion"""
     
     # Mock payment capture
-    return CaptureResponse(ok=True)
+    return ok_response()
 
 # SOS API
 @api_router.post("/support/sos", response_model=CaptureResponse)
@@ -2379,7 +2989,7 @@ async def emergency_sos(
     """Emergency SOS support request"""
     
     # Mock SOS handling - in production, would alert support team
-    return CaptureResponse(ok=True)
+    return ok_response()
 
 # Rating & Tip Models
 class CustomerInfo(BaseModel):
@@ -2448,8 +3058,91 @@ class RatingItem(BaseModel):
 class OwnerRatingsResponse(BaseModel):
     items: List[RatingItem]
 
-# In-memory rating storage (in production, use database)
+# Ratings live in a Redis hash per booking when REDIS_URL is set; this dict is
+# the single-process fallback
 ratings_data = {}  # bookingId -> {customer_rating: {...}, partner_rating: {...}}
+ratings_summary = OrderedDict()  # bookingId -> {customer_rating: summary, ...}, latest rated last
+
+# Tip presets offered on the rating screen, as fractions of the booking total
+TIP_PRESET_RATES = (0.0, 0.15, 0.18, 0.20, 0.25)
+
+# Rated booking ids scored by the time of their latest rating, trimmed to the
+# most recent RATINGS_INDEX_MAX_SIZE
+RATINGS_INDEX_KEY = "ratings:index"
+RATINGS_INDEX_MAX_SIZE = 10000
+
+# KEYS: rating hash, summary hash, index; ARGV: field, rating, summary, score,
+# booking id, index size
+SAVE_RATING_LUA = """
+if redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[5])
+redis.call('ZREMRANGEBYRANK', KEYS[3], 0, -tonumber(ARGV[6]) - 1)
+return 1
+"""
+save_rating_script = redis_client.register_script(SAVE_RATING_LUA) if redis_client else None
+
+def rating_key(booking_id: str) -> str:
+    return f"rating:{booking_id}"
+
+def rating_summary_key(booking_id: str) -> str:
+    return f"rating:{booking_id}:summary"
+
+def summarize_rating(field: str, rating: dict) -> dict:
+    """The owner dashboard's inputs from one side's rating, computed at write time"""
+    if field == "partner_rating":
+        return {"stars": rating["stars"]}
+    return {
+        "stars": rating["stars"],
+        "tip": (rating.get("tip") or {}).get("amount", 0),
+        "detailed": len(rating.get("comment") or "") > 100
+    }
+
+def load_rating_hash(raw: dict) -> dict:
+    return {field.decode(): orjson.loads(value) for field, value in raw.items()}
+
+async def get_ratings(booking_id: str) -> dict:
+    """Ratings for a booking keyed by customer_rating / partner_rating"""
+    if redis_client is None:
+        return ratings_data.get(booking_id, {})
+    return load_rating_hash(await redis_client.hgetall(rating_key(booking_id)))
+
+async def save_rating(booking_id: str, field: str, rating: dict) -> bool:
+    """Store a rating unless one already exists; returns False on a duplicate"""
+    summary = summarize_rating(field, rating)
+    if redis_client is None:
+        booking_ratings = ratings_data.setdefault(booking_id, {})
+        if field in booking_ratings:
+            return False
+        booking_ratings[field] = rating
+        ratings_summary.setdefault(booking_id, {})[field] = summary
+        ratings_summary.move_to_end(booking_id)
+        while len(ratings_summary) > RATINGS_INDEX_MAX_SIZE:
+            ratings_summary.popitem(last=False)
+        return True
+    
+    # One script round trip: a duplicate returns before any write, so it
+    # neither changes the stored rating nor re-scores the booking in the index
+    created = await save_rating_script(
+        keys=[rating_key(booking_id), rating_summary_key(booking_id), RATINGS_INDEX_KEY],
+        args=[field, orjson.dumps(rating), orjson.dumps(summary), time.time(), booking_id, RATINGS_INDEX_MAX_SIZE]
+    )
+    return bool(created)
+
+async def latest_rating_summaries(limit: int = 20) -> List[tuple]:
+    """(booking_id, summaries by side) for the `limit` most recently rated bookings"""
+    if redis_client is None:
+        return [(booking_id, ratings_summary[booking_id]) for booking_id in itertools.islice(reversed(ratings_summary), limit)]
+    booking_ids = await redis_client.zrevrange(RATINGS_INDEX_KEY, 0, limit - 1)
+    if not booking_ids:
+        return []
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for booking_id in booking_ids:
+            pipe.hgetall(rating_summary_key(booking_id.decode()))
+        rows = await pipe.execute()
+    return [(booking_id.decode(), load_rating_hash(raw)) for booking_id, raw in zip(booking_ids, rows)]
 
 # Rating & Tip API Endpoints
 @api_router.get("/ratings/context/{booking_id}", response_model=RatingContext)
@@ -2460,12 +3153,12 @@ async def get_rating_context(
     """Get rating context for a completed booking"""
     
     # Get booking data
-    booking = await db.bookings.find_one({"booking_id": booking_id})
+    booking = await get_cached_booking(booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
     # Check if already rated
-    existing_ratings = ratings_data.get(booking_id, {})
+    existing_ratings = await get_ratings(booking_id)
     already_rated = {
         "customer": "customer_rating" in existing_ratings,
         "partner": "partner_rating" in existing_ratings
@@ -2483,11 +3176,11 @@ async def get_rating_context(
     
     customer_info = CustomerInfo(
         id=current_user.id,
-        name=current_user.email.split('@')[0].title()
+        name=current_user.display_name
     )
     
     # Calculate tip presets (percentages of total)
-    tip_presets = [0, round(total * 0.15, 2), round(total * 0.18, 2), round(total * 0.20, 2), round(total * 0.25, 2)]
+    tip_presets = [round(total * rate, 2) for rate in TIP_PRESET_RATES]
     
     return RatingContext(
         bookingId=booking_id,
@@ -2502,26 +3195,21 @@ async def get_rating_context(
 @api_router.post("/ratings/customer", response_model=CustomerRatingResponse)
 async def submit_customer_rating(
     request: CustomerRatingRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("customer"))
 ):
     """Submit customer rating and optional tip"""
     
-    if current_user.role != "customer":
-        raise HTTPException(status_code=403, detail="Customer access required")
-    
-    # Check for duplicate submission
-    if request.bookingId in ratings_data:
-        existing = ratings_data[request.bookingId]
-        if "customer_rating" in existing:
-            # Check idempotency
-            if existing["customer_rating"].get("idempotencyKey") == request.idempotencyKey:
-                # Return existing response
-                return CustomerRatingResponse(
-                    ok=True,
-                    tipCapture=TipCaptureInfo(ok=True, paymentIntentId=existing["customer_rating"].get("tipPaymentIntentId", ""))
-                )
-            else:
-                raise HTTPException(status_code=409, detail="Already rated")
+    # Check for duplicate submission before any tip is charged
+    existing_rating = (await get_ratings(request.bookingId)).get("customer_rating")
+    if existing_rating is not None:
+        # Check idempotency
+        if existing_rating.get("idempotencyKey") == request.idempotencyKey:
+            # Return existing response
+            return ORJSONResponse({
+                "ok": True,
+                "tipCapture": {"ok": True, "paymentIntentId": existing_rating.get("tipPaymentIntentId", "")}
+            })
+        raise HTTPException(status_code=409, detail="Already rated")
     
     # Validate star rating
     if not (1 <= request.stars <= 5):
@@ -2533,18 +3221,15 @@ async def submit_customer_rating(
     
     if request.tip and request.tip.amount > 0:
         # Mock tip capture (in production, integrate with Stripe)
-        tip_payment_intent_id = f"pi_tip_{secrets.token_urlsafe(16)}"
+        tip_payment_intent_id = f"pi_tip_{urlsafe_token(16)}"
         
         # Simulate payment failure for testing (5% failure rate)
-        if hash(request.idempotencyKey) % 20 == 0:
+        if stable_hash(request.idempotencyKey) % 20 == 0:
             tip_capture_success = False
             raise HTTPException(status_code=402, detail="Tip payment declined")
     
-    # Store rating
-    if request.bookingId not in ratings_data:
-        ratings_data[request.bookingId] = {}
-    
-    ratings_data[request.bookingId]["customer_rating"] = {
+    # Store rating (a concurrent submission that won the race is a duplicate)
+    stored = await save_rating(request.bookingId, "customer_rating", {
         "stars": request.stars,
         "compliments": request.compliments,
         "comment": request.comment,
@@ -2553,96 +3238,75 @@ async def submit_customer_rating(
         "tipPaymentIntentId": tip_payment_intent_id,
         "submittedAt": datetime.utcnow().isoformat(),
         "userId": current_user.id
-    }
+    })
+    if not stored:
+        raise HTTPException(status_code=409, detail="Already rated")
     
-    return CustomerRatingResponse(
-        ok=True,
-        tipCapture=TipCaptureInfo(
-            ok=tip_capture_success,
-            paymentIntentId=tip_payment_intent_id
-        )
-    )
+    return ORJSONResponse({
+        "ok": True,
+        "tipCapture": {"ok": tip_capture_success, "paymentIntentId": tip_payment_intent_id}
+    })
 
 @api_router.post("/ratings/partner", response_model=PartnerRatingResponse)
 async def submit_partner_rating(
     request: PartnerRatingRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Submit partner rating for customer"""
     
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    # Check for duplicate submission
-    if request.bookingId in ratings_data:
-        existing = ratings_data[request.bookingId]
-        if "partner_rating" in existing:
-            # Check idempotency
-            if existing["partner_rating"].get("idempotencyKey") == request.idempotencyKey:
-                # Return existing response
-                return PartnerRatingResponse(ok=True)
-            else:
-                raise HTTPException(status_code=409, detail="Already rated")
-    
     # Validate star rating
     if not (1 <= request.stars <= 5):
         raise HTTPException(status_code=400, detail="Stars must be between 1 and 5")
     
-    # Store rating
-    if request.bookingId not in ratings_data:
-        ratings_data[request.bookingId] = {}
-    
-    ratings_data[request.bookingId]["partner_rating"] = {
+    # Store first: with nothing to charge, the common not-yet-rated path is a
+    # single write, and only a rejected duplicate reads the stored rating
+    stored = await save_rating(request.bookingId, "partner_rating", {
         "stars": request.stars,
         "notes": request.notes,
         "comment": request.comment,
         "idempotencyKey": request.idempotencyKey,
         "submittedAt": datetime.utcnow().isoformat(),
         "userId": current_user.id
-    }
+    })
+    if not stored:
+        # Check idempotency
+        existing_rating = (await get_ratings(request.bookingId)).get("partner_rating", {})
+        if existing_rating.get("idempotencyKey") != request.idempotencyKey:
+            raise HTTPException(status_code=409, detail="Already rated")
     
-    return PartnerRatingResponse(ok=True)
+    return ok_response()
 
 @api_router.post("/billing/tip", response_model=TipCaptureResponse)
 async def capture_tip(
     request: TipCaptureRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("customer"))
 ):
     """Capture tip payment separately"""
     
-    if current_user.role != "customer":
-        raise HTTPException(status_code=403, detail="Customer access required")
-    
     # Mock tip capture
-    payment_intent_id = f"pi_tip_{secrets.token_urlsafe(16)}"
+    payment_intent_id = f"pi_tip_{urlsafe_token(16)}"
     
     # Simulate payment failure for testing
     if request.amount > 50:  # Large tips more likely to fail
         raise HTTPException(status_code=402, detail="Tip card declined")
     
-    return TipCaptureResponse(
-        ok=True,
-        paymentIntentId=payment_intent_id
-    )
+    return ORJSONResponse({"ok": True, "paymentIntentId": payment_intent_id})
 
 @api_router.get("/owner/ratings", response_model=OwnerRatingsResponse)
-async def get_owner_ratings_dashboard(current_user: User = Depends(get_current_user)):
+async def get_owner_ratings_dashboard(current_user: User = Depends(require_role("owner"))):
     """Get owner ratings dashboard"""
     
-    if current_user.role != "owner":
-        raise HTTPException(status_code=403, detail="Owner access required")
+    # The 20 most recently rated bookings, summarized when each rating was written
+    top_ratings = await latest_rating_summaries(20)
     
     # Process ratings data for dashboard
     items = []
     
-    for booking_id, rating_data in ratings_data.items():
-        customer_rating = rating_data.get("customer_rating", {})
-        partner_rating = rating_data.get("partner_rating", {})
-        
-        # Calculate metrics
-        customer_stars = customer_rating.get("stars", 0)
-        partner_stars = partner_rating.get("stars", 0)
-        tip_amount = customer_rating.get("tip", {}).get("amount", 0)
+    for booking_id, summaries in top_ratings:
+        customer_summary = summaries.get("customer_rating", {})
+        customer_stars = customer_summary.get("stars", 0)
+        partner_stars = summaries.get("partner_rating", {}).get("stars", 0)
+        tip_amount = customer_summary.get("tip", 0)
         
         # Determine flags
         flags = []
@@ -2652,21 +3316,18 @@ async def get_owner_ratings_dashboard(current_user: User = Depends(get_current_u
             flags.append("low_partner_rating")
         if tip_amount > 20:
             flags.append("high_tip")
-        if customer_rating.get("comment") and len(customer_rating["comment"]) > 100:
+        if customer_summary.get("detailed"):
             flags.append("detailed_feedback")
         
-        items.append(RatingItem(
-            bookingId=booking_id,
-            partnerRating=float(partner_stars),
-            customerRating=float(customer_stars),
-            tip=float(tip_amount),
-            flags=flags
-        ))
-    
-    # Sort by most recent (mock - in production use timestamps)
-    items = sorted(items, key=lambda x: x.bookingId, reverse=True)[:20]
+        items.append({
+            "bookingId": booking_id,
+            "partnerRating": float(partner_stars),
+            "customerRating": float(customer_stars),
+            "tip": float(tip_amount),
+            "flags": flags
+        })
     
-    return OwnerRatingsResponse(items=items)
+    return ORJSONResponse({"items": items})
 
 # ================================================================================================
 # PAGE-9-EARNINGS: Partner Earnings & Payouts System (Uber-like)
@@ -2792,14 +3453,18 @@ class NotificationPrefsRequest(BaseModel):
 
 # In-memory storage for earnings data (in production, use database)
 partner_earnings_data = {}
-export_jobs = {}
-payout_history = {}
+# Export jobs expire an hour after creation; TTLCache drops them on later writes
+EXPORT_JOB_MAX_SIZE = 10000
+EXPORT_JOB_TTL_SECONDS = 3600
+export_jobs = TTLCache(maxsize=EXPORT_JOB_MAX_SIZE, ttl=EXPORT_JOB_TTL_SECONDS)
+PAYOUT_HISTORY_MAX_ITEMS = 200
+payout_history = {}  # partnerId -> deque of PayoutItem, newest first
 bank_accounts = {}
 tax_info = {}
 notification_prefs = {}
 
 # Helper function to get partner earnings summary
-def get_partner_earnings_summary(booking_id: str, partner_id: str):
+async def get_partner_earnings_summary(booking_id: str, partner_id: str):
     """Get partner earnings summary including tips"""
     
     # Get booking data
@@ -2809,9 +3474,9 @@ def get_partner_earnings_summary(booking_id: str, partner_id: str):
     
     # Get tip from rating
     tip_amount = 0.0
-    if booking_id in ratings_data:
-        customer_rating = ratings_data[booking_id].get("customer_rating", {})
-        tip_amount = customer_rating.get("tip", {}).get("amount", 0)
+    customer_rating = (await get_ratings(booking_id)).get("customer_rating")
+    if customer_rating:
+        tip_amount = (customer_rating.get("tip") or {}).get("amount", 0)
     
     total = base_amount * surge_multiplier + adjustments + tip_amount
     
@@ -2824,135 +3489,138 @@ def get_partner_earnings_summary(booking_id: str, partner_id: str):
         "currency": "usd"
     }
 
+# Mock earnings cover the past EARNINGS_WEEKS weeks, oldest first; the most
+# recent EARNINGS_PAYOUT_WEEKS are available for payout
+EARNINGS_WEEKS = 12
+EARNINGS_PAYOUT_WEEKS = 2
+
 def generate_earnings_data(partner_id: str):
-    """Generate mock earnings data for partner"""
-    if partner_id not in partner_earnings_data:
-        # Generate mock data for past 12 weeks
-        weeks_data = []
-        total_tips_ytd = 0
-        available_balance = 0
-        
-        for i in range(12):
-            week_earnings = random.uniform(200, 800)
-            week_tips = random.uniform(50, 200)
-            jobs_count = random.randint(8, 25)
-            
-            weeks_data.append({
-                "week": i + 1,
-                "earnings": week_earnings,
-                "tips": week_tips,
-                "jobs": jobs_count,
-                "date": (datetime.utcnow() - timedelta(weeks=11-i)).isoformat()
-            })
-            
-            total_tips_ytd += week_tips
-            if i >= 10:  # Last 2 weeks available for payout
-                available_balance += week_earnings + week_tips
+    """Generate mock earnings data for partner, one array per column"""
+    earnings_data = partner_earnings_data.get(partner_id)
+    if earnings_data is None:
+        earnings = mock_rng.uniform(200, 800, EARNINGS_WEEKS)
+        tips = mock_rng.uniform(50, 200, EARNINGS_WEEKS)
+        jobs = mock_rng.integers(8, 26, EARNINGS_WEEKS)
+        now = datetime.utcnow()
+        week_starts = [now - timedelta(weeks=EARNINGS_WEEKS - 1 - i) for i in range(EARNINGS_WEEKS)]
+        week_ends = [week_start + timedelta(days=6) for week_start in week_starts]
         
-        partner_earnings_data[partner_id] = {
-            "weeks": weeks_data,
-            "tips_ytd": total_tips_ytd,
-            "available_balance": available_balance
+        earnings_data = partner_earnings_data[partner_id] = {
+            "earnings": earnings,
+            "tips": tips,
+            "jobs": jobs,
+            "week_starts": week_starts,
+            # Formatted once here so statement reads do no datetime formatting
+            "week_start_isos": [week_start.isoformat() for week_start in week_starts],
+            "week_end_isos": [week_end.isoformat() for week_end in week_ends],
+            "week_labels": [
+                f"Week {week_start.strftime('%b %d')} - {week_end.strftime('%b %d')}"
+                for week_start, week_end in zip(week_starts, week_ends)
+            ],
+            "payout_dates": [(week_start + timedelta(days=7)).isoformat() for week_start in week_starts],
+            # The summary body, summed once; payouts debit availableBalance in place
+            "summary": {
+                "currency": "usd",
+                "thisWeek": {"amount": float(earnings[-1] + tips[-1]), "jobs": int(jobs[-1])},
+                "tipsYtd": float(tips.sum()),
+                "availableBalance": float(earnings[-EARNINGS_PAYOUT_WEEKS:].sum() + tips[-EARNINGS_PAYOUT_WEEKS:].sum())
+            }
         }
     
-    return partner_earnings_data[partner_id]
+    return earnings_data
 
 # Partner Earnings API Endpoints
 @api_router.get("/partner/earnings/summary", response_model=EarningsSummaryResponse)
-async def get_earnings_summary(current_user: User = Depends(get_current_user)):
+async def get_earnings_summary(current_user: User = Depends(require_role("partner"))):
     """Get partner earnings summary"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
+    return ORJSONResponse(generate_earnings_data(current_user.id)["summary"])
+
+# The series and statement pages depend only on the partner's mock weeks,
+# which never change in-process (payouts only touch the balance). Each is
+# serialized once and then revalidated with an ETag
+EARNINGS_CACHE_MAX_SIZE = 1024
+EARNINGS_CACHE_CONTROL = "private, max-age=30"
+
+def json_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+def etag_response(request: Request, etag: str, body: bytes) -> Response:
+    """The cached JSON body, or 304 when the client already holds it"""
+    headers = {"ETag": etag, "Cache-Control": EARNINGS_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@lru_cache(maxsize=EARNINGS_CACHE_MAX_SIZE)
+def earnings_series_body(partner_id: str) -> tuple[str, bytes]:
+    earnings_data = generate_earnings_data(partner_id)
+    
+    # Weekly data points, zipped straight from the columns
+    points = [
+        {"date": week_start_iso, "earnings": earnings, "tips": tips}
+        for week_start_iso, earnings, tips in zip(
+            earnings_data["week_start_isos"], earnings_data["earnings"].tolist(), earnings_data["tips"].tolist()
+        )
+    ]
+    body = orjson.dumps({"points": points})
+    return json_etag(body), body
+
+@lru_cache(maxsize=EARNINGS_CACHE_MAX_SIZE)
+def statements_page_body(partner_id: str, page: int, size: int) -> tuple[str, bytes]:
+    earnings_data = generate_earnings_data(partner_id)
     
-    earnings_data = generate_earnings_data(current_user.id)
-    current_week = earnings_data["weeks"][-1]
+    # Pagination, most recent week first: only the page's weeks are built
+    start_idx = (page - 1) * size
+    end_idx = start_idx + size
+    next_page = page + 1 if end_idx < EARNINGS_WEEKS else None
     
-    return EarningsSummaryResponse(
-        currency="usd",
-        thisWeek={
-            "amount": current_week["earnings"] + current_week["tips"],
-            "jobs": current_week["jobs"]
-        },
-        tipsYtd=earnings_data["tips_ytd"],
-        availableBalance=earnings_data["available_balance"]
-    )
+    week_amounts = earnings_data["earnings"] + earnings_data["tips"]
+    statements = [
+        {
+            "id": f"st_{partner_id}_{i:02d}",
+            "weekLabel": earnings_data["week_labels"][i],
+            "amount": float(week_amounts[i]),
+            "trips": int(earnings_data["jobs"][i]),
+            "status": "finalized" if i < EARNINGS_WEEKS - 1 else "pending",
+            "payoutDate": earnings_data["payout_dates"][i]
+        }
+        for i in range(EARNINGS_WEEKS - 1, -1, -1)[start_idx:end_idx]
+    ]
+    
+    body = orjson.dumps({"items": statements, "nextPage": next_page})
+    return json_etag(body), body
 
 @api_router.get("/partner/earnings/series", response_model=EarningsSeriesResponse)
 async def get_earnings_series(
+    request: Request,
     fromDate: Optional[str] = Query(None),
     toDate: Optional[str] = Query(None),
-    bucket: str = Query("week", regex="^(day|week)$"),
-    current_user: User = Depends(get_current_user)
+    bucket: Literal["day", "week"] = Query("week"),
+    current_user: User = Depends(require_role("partner"))
 ):
     """Get earnings series data for charts"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    earnings_data = generate_earnings_data(current_user.id)
-    
-    # Return weekly data points
-    points = []
-    for week_data in earnings_data["weeks"]:
-        points.append(EarningsSeriesPoint(
-            date=week_data["date"],
-            earnings=week_data["earnings"],
-            tips=week_data["tips"]
-        ))
-    
-    return EarningsSeriesResponse(points=points)
+    # The mock series is always the weekly points; the filters do not apply yet
+    return etag_response(request, *earnings_series_body(current_user.id))
 
 @api_router.get("/partner/earnings/statements", response_model=StatementsListResponse)
 async def list_statements(
+    request: Request,
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=50),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """List partner earnings statements"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    earnings_data = generate_earnings_data(current_user.id)
-    
-    # Generate mock statements
-    statements = []
-    for i, week_data in enumerate(earnings_data["weeks"]):
-        statement_id = f"st_{current_user.id}_{i:02d}"
-        week_start = datetime.fromisoformat(week_data["date"].replace('Z', '+00:00'))
-        week_label = f"Week {week_start.strftime('%b %d')} - {(week_start + timedelta(days=6)).strftime('%b %d')}"
-        
-        statements.append(StatementItem(
-            id=statement_id,
-            weekLabel=week_label,
-            amount=week_data["earnings"] + week_data["tips"],
-            trips=week_data["jobs"],
-            status="finalized" if i < 11 else "pending",
-            payoutDate=(week_start + timedelta(days=7)).isoformat()
-        ))
-    
-    # Reverse to show most recent first
-    statements.reverse()
-    
-    # Pagination
-    start_idx = (page - 1) * size
-    end_idx = start_idx + size
-    page_statements = statements[start_idx:end_idx]
-    
-    next_page = page + 1 if end_idx < len(statements) else None
-    
-    return StatementsListResponse(
-        items=page_statements,
-        nextPage=next_page
-    )
+    return etag_response(request, *statements_page_body(current_user.id, page, size))
+
+STATEMENT_SERVICE_TYPES = ("Cleaning", "Lawn Care", "Snow Removal", "Dog Walking", "Beauty", "Baby Care")
 
 @api_router.get("/partner/earnings/statements/{statement_id}", response_model=StatementDetail)
 async def get_statement_detail(
     statement_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Get detailed statement information"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     # Parse statement ID to get week index
     try:
         week_idx = int(statement_id.split('_')[-1])
@@ -2961,76 +3629,166 @@ async def get_statement_detail(
     
     earnings_data = generate_earnings_data(current_user.id)
     
-    if week_idx >= len(earnings_data["weeks"]):
+    if week_idx >= EARNINGS_WEEKS:
         raise HTTPException(status_code=404, detail="Statement not found")
     
-    week_data = earnings_data["weeks"][week_idx]
-    week_start = datetime.fromisoformat(week_data["date"].replace('Z', '+00:00'))
-    
-    # Generate mock job line items
-    jobs = []
-    for j in range(week_data["jobs"]):
-        job_date = week_start + timedelta(days=random.randint(0, 6))
-        service_types = ["Cleaning", "Lawn Care", "Snow Removal", "Dog Walking", "Beauty", "Baby Care"]
-        
-        jobs.append(JobLineItem(
-            bookingId=f"bk_{secrets.token_urlsafe(8)}",
-            date=job_date.isoformat(),
-            service=random.choice(service_types),
-            duration=random.randint(30, 180),
-            payout=random.uniform(15, 80),
-            tip=random.uniform(0, 25)
-        ))
+    week_start = earnings_data["week_starts"][week_idx]
+    week_earnings = float(earnings_data["earnings"][week_idx])
+    week_tips = float(earnings_data["tips"][week_idx])
+    
+    # Generate mock job line items, one batch draw per column
+    job_count = int(earnings_data["jobs"][week_idx])
+    jobs = [
+        JobLineItem.model_construct(
+            bookingId=f"bk_{token}",
+            date=(week_start + timedelta(days=day)).isoformat(),
+            service=service,
+            duration=duration,
+            payout=payout,
+            tip=tip
+        )
+        for token, day, service, duration, payout, tip in zip(
+            urlsafe_tokens(9, job_count),
+            mock_rng.integers(0, 7, job_count).tolist(),
+            mock_rng.choice(STATEMENT_SERVICE_TYPES, job_count).tolist(),
+            mock_rng.integers(30, 181, job_count).tolist(),
+            mock_rng.uniform(15, 80, job_count).round(2).tolist(),
+            mock_rng.uniform(0, 25, job_count).round(2).tolist()
+        )
+    ]
     
-    gross = week_data["earnings"] + week_data["tips"]
+    gross = week_earnings + week_tips
     fees = gross * 0.15  # 15% platform fee
     tax_withheld = gross * 0.1  # 10% tax withheld
     net = gross - fees - tax_withheld
     
-    return StatementDetail(
+    # Dump and send directly; the constructed models need no re-validation
+    statement = StatementDetail.model_construct(
         id=statement_id,
         period={
-            "from": week_start.isoformat(),
-            "to": (week_start + timedelta(days=6)).isoformat()
+            "from": earnings_data["week_start_isos"][week_idx],
+            "to": earnings_data["week_end_isos"][week_idx]
         },
         currency="usd",
         gross=gross,
-        tips=week_data["tips"],
-        surge=week_data["earnings"] * 0.1,  # 10% surge
+        tips=week_tips,
+        surge=week_earnings * 0.1,  # 10% surge
         adjustments=0.0,
         fees=fees,
         taxWithheld=tax_withheld,
         net=net,
         jobs=jobs
     )
+    return ORJSONResponse(statement.model_dump())
+
+# Signed download and onboarding links are reused for a few minutes, so
+# repeated clicks get the same link instead of minting a new token each time
+SIGNED_URL_CACHE_MAX_SIZE = 10000
+SIGNED_URL_TTL_SECONDS = 300
+signed_url_cache = TTLCache(maxsize=SIGNED_URL_CACHE_MAX_SIZE, ttl=SIGNED_URL_TTL_SECONDS)
+
+def cached_signed_url(key: tuple, build) -> str:
+    """The cached link for `key`, or build(token) with a fresh token"""
+    url = signed_url_cache.get(key)
+    if url is None:
+        url = signed_url_cache[key] = build(urlsafe_token(32))
+    return url
 
 @api_router.get("/partner/earnings/statements/{statement_id}/pdf", response_model=StatementPdfResponse)
 async def download_statement_pdf(
     statement_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Generate PDF download URL for statement"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     # Mock PDF URL - in production, generate actual PDF
-    pdf_url = f"https://statements.shine.com/pdf/{statement_id}.pdf?token={secrets.token_urlsafe(32)}"
+    pdf_url = cached_signed_url(
+        ("statement_pdf", current_user.id, statement_id),
+        lambda token: f"https://statements.shine.com/pdf/{statement_id}.pdf?token={token}"
+    )
     
     return StatementPdfResponse(url=pdf_url)
 
+# CSV exports are written by a fixed pool of workers so a burst of requests
+# cannot pile file writes onto the event loop; the gzip write itself runs in
+# the thread pool
+EXPORT_WORKERS = 4
+EXPORT_QUEUE_MAX_SIZE = 1000
+EXPORT_DIR = ROOT_DIR / "exports"
+# Files are swept once they outlive their job's entry in export_jobs
+EXPORT_SWEEP_INTERVAL_SECONDS = 300
+EXPORT_CSV_HEADER = ("weekStart", "weekLabel", "earnings", "tips", "trips", "total")
+export_queue = asyncio.Queue(maxsize=EXPORT_QUEUE_MAX_SIZE)
+
+def iter_export_rows(earnings_data: dict, from_date: datetime, to_date: datetime):
+    """Yield CSV rows for the weeks starting within [from_date, to_date]"""
+    columns = zip(
+        earnings_data["week_starts"], earnings_data["week_start_isos"], earnings_data["week_labels"],
+        earnings_data["earnings"].tolist(), earnings_data["tips"].tolist(), earnings_data["jobs"].tolist()
+    )
+    for week_start, week_start_iso, week_label, earnings, tips, trips in columns:
+        if from_date <= week_start <= to_date:
+            yield week_start_iso, week_label, round(earnings, 2), round(tips, 2), trips, round(earnings + tips, 2)
+
+def write_export_csv(path: Path, rows) -> None:
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as export_file:
+        writer = csv.writer(export_file)
+        writer.writerow(EXPORT_CSV_HEADER)
+        writer.writerows(rows)
+
+async def run_export_worker():
+    while True:
+        job_id = await export_queue.get()
+        job = export_jobs.get(job_id)
+        if job is None:
+            continue  # expired while queued
+        
+        rows = iter_export_rows(generate_earnings_data(job["partnerId"]), job["fromDate"], job["toDate"])
+        try:
+            await to_thread.run_sync(write_export_csv, export_file_path(job_id), rows)
+        except Exception:
+            logger.exception("Export %s failed", job_id)
+            job["status"] = "error"
+        else:
+            job["status"] = "ready"
+            job["url"] = f"/api/partner/earnings/export/{job_id}/download"
+
+def export_file_path(job_id: str) -> Path:
+    return EXPORT_DIR / f"{job_id}.csv.gz"
+
+def sweep_export_files() -> None:
+    """Delete export files older than the export job TTL"""
+    cutoff = time.time() - EXPORT_JOB_TTL_SECONDS
+    for path in EXPORT_DIR.glob("*.csv.gz"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+async def run_export_sweeper():
+    while True:
+        await asyncio.sleep(EXPORT_SWEEP_INTERVAL_SECONDS)
+        try:
+            await to_thread.run_sync(sweep_export_files)
+        except Exception:
+            logger.exception("Export file sweep failed")
+
+def naive_utc(value: datetime) -> datetime:
+    """Drop the offset from an aware datetime, matching the module's naive UTC times"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
 @api_router.post("/partner/earnings/export", response_model=ExportResponse)
 async def request_export(
     request: ExportRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Request CSV export of earnings data"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     # Validate date range
     try:
-        from_date = datetime.fromisoformat(request.fromDate.replace('Z', '+00:00'))
-        to_date = datetime.fromisoformat(request.toDate.replace('Z', '+00:00'))
+        from_date = naive_utc(datetime.fromisoformat(request.fromDate.replace('Z', '+00:00')))
+        to_date = naive_utc(datetime.fromisoformat(request.toDate.replace('Z', '+00:00')))
         
         if (to_date - from_date).days > 90:
             raise HTTPException(status_code=400, detail="Date range cannot exceed 90 days")
@@ -3038,81 +3796,101 @@ async def request_export(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format")
     
-    # Create export job
-    job_id = f"exp_{secrets.token_urlsafe(16)}"
+    # Create export job; nothing awaits before it is stored, so no worker can
+    # take the id first
+    job_id = f"exp_{urlsafe_token(16)}"
+    try:
+        export_queue.put_nowait(job_id)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Too many exports in progress, try again shortly")
+    
     export_jobs[job_id] = {
         "partnerId": current_user.id,
         "status": "queued",
-        "fromDate": request.fromDate,
-        "toDate": request.toDate,
+        "fromDate": from_date,
+        "toDate": to_date,
         "serviceType": request.serviceType,
-        "createdAt": datetime.utcnow().isoformat()
+        "createdAt": datetime.utcnow()
     }
     
     return ExportResponse(jobId=job_id, status="queued")
 
+def get_partner_export_job(job_id: str, partner_id: str) -> dict:
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job["partnerId"] != partner_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return job
+
 @api_router.get("/partner/earnings/export/{job_id}", response_model=ExportStatusResponse)
 async def get_export_status(
     job_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Get export job status"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    if job_id not in export_jobs:
-        raise HTTPException(status_code=404, detail="Export job not found")
-    
-    job = export_jobs[job_id]
-    if job["partnerId"] != current_user.id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    # Mock processing - in production, check actual job status
-    created_at = datetime.fromisoformat(job["createdAt"].replace('Z', '+00:00'))
-    if (datetime.utcnow() - created_at).seconds > 30:  # 30 seconds processing time
-        job["status"] = "ready"
-        job["url"] = f"https://exports.shine.com/csv/{job_id}.csv?token={secrets.token_urlsafe(32)}"
+    job = get_partner_export_job(job_id, current_user.id)
     
+    # Status and url are set by the export worker
     return ExportStatusResponse(
         status=job["status"],
         url=job.get("url")
     )
 
+@api_router.get("/partner/earnings/export/{job_id}/download")
+async def download_export(
+    job_id: str,
+    current_user: User = Depends(require_role("partner"))
+):
+    """Download a finished earnings CSV export"""
+    job = get_partner_export_job(job_id, current_user.id)
+    if job["status"] != "ready":
+        raise HTTPException(status_code=409, detail="Export not ready")
+    
+    path = export_file_path(job_id)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Export file expired")
+    
+    return FileResponse(path, media_type="application/gzip", filename=f"earnings_{job_id}.csv.gz")
+
 # Payout Management APIs
+MOCK_PAYOUT_WEEKS = 8
+
 @api_router.get("/partner/payouts", response_model=PayoutsListResponse)
-async def list_payouts(current_user: User = Depends(get_current_user)):
+async def list_payouts(current_user: User = Depends(require_role("partner"))):
     """List partner payout history"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    # Generate mock payout history
-    if current_user.id not in payout_history:
-        payouts = []
-        for i in range(8):
-            payout_date = datetime.utcnow() - timedelta(weeks=i)
-            amount = random.uniform(300, 1200)
-            
-            payouts.append(PayoutItem(
-                id=f"po_{secrets.token_urlsafe(16)}",
-                date=payout_date.isoformat(),
+    # Generate mock payout history, one batch draw per column
+    history = payout_history.get(current_user.id)
+    if history is None:
+        now = datetime.utcnow()
+        in_transit = mock_rng.random(MOCK_PAYOUT_WEEKS) < 0.5
+        in_transit[0] = False  # the latest payout has always landed
+        
+        payouts = [
+            PayoutItem.model_construct(
+                id=f"po_{token}",
+                date=(now - timedelta(weeks=i)).isoformat(),
                 amount=amount,
-                status=random.choice(["paid", "in_transit"]) if i > 0 else "paid",
+                status="in_transit" if pending else "paid",
                 destination="Bank ****1234"
+            )
+            for i, (token, amount, pending) in enumerate(zip(
+                urlsafe_tokens(18, MOCK_PAYOUT_WEEKS),
+                mock_rng.uniform(300, 1200, MOCK_PAYOUT_WEEKS).tolist(),
+                in_transit.tolist()
             ))
+        ]
         
-        payout_history[current_user.id] = payouts
+        history = payout_history[current_user.id] = deque(payouts, maxlen=PAYOUT_HISTORY_MAX_ITEMS)
     
-    return PayoutsListResponse(items=payout_history[current_user.id])
+    return ORJSONResponse({"items": [payout.model_dump() for payout in history]})
 
 @api_router.post("/partner/payouts/instant", response_model=InstantPayoutResponse)
 async def instant_payout(
     request: InstantPayoutRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Process instant payout"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     # Check bank verification
     bank_info = bank_accounts.get(current_user.id, {"verified": False})
     if not bank_info["verified"]:
@@ -3122,9 +3900,10 @@ async def instant_payout(
     if request.amount < 1.0:
         raise HTTPException(status_code=400, detail="Below minimum amount ($1.00)")
     
-    # Check available balance
-    earnings_data = generate_earnings_data(current_user.id)
-    if request.amount > earnings_data["available_balance"]:
+    # Check available balance. Nothing below awaits before the debit, so
+    # concurrent payouts cannot both pass this check
+    summary = generate_earnings_data(current_user.id)["summary"]
+    if request.amount > summary["availableBalance"]:
         raise HTTPException(status_code=400, detail="Insufficient balance")
     
     # Calculate fee
@@ -3140,13 +3919,11 @@ async def instant_payout(
     payout_id = f"po_{secrets.token_urlsafe(16)}"
     
     # Update balance
-    earnings_data["available_balance"] -= request.amount
+    summary["availableBalance"] -= request.amount
     
     # Add to history
-    if current_user.id not in payout_history:
-        payout_history[current_user.id] = []
-    
-    payout_history[current_user.id].insert(0, PayoutItem(
+    history = payout_history.setdefault(current_user.id, deque(maxlen=PAYOUT_HISTORY_MAX_ITEMS))
+    history.appendleft(PayoutItem.model_construct(
         id=payout_id,
         date=datetime.utcnow().isoformat(),
         amount=request.amount,
@@ -3164,100 +3941,91 @@ async def instant_payout(
 @api_router.post("/partner/bank/onboard", response_model=BankOnboardResponse)
 async def onboard_bank_account(
     request: BankOnboardRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Start bank account onboarding process"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     # Mock Stripe Connect onboarding URL
-    onboard_url = f"https://connect.stripe.com/setup/e/{secrets.token_urlsafe(32)}?return_url={request.returnUrl}"
+    onboard_url = cached_signed_url(
+        ("bank_onboard", current_user.id, request.returnUrl),
+        lambda token: f"https://connect.stripe.com/setup/e/{token}?return_url={request.returnUrl}"
+    )
     
     return BankOnboardResponse(url=onboard_url)
 
 @api_router.get("/partner/bank/status", response_model=BankStatusResponse)
-async def get_bank_status(current_user: User = Depends(get_current_user)):
+async def get_bank_status(current_user: User = Depends(require_role("partner"))):
     """Get bank account verification status"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     # Initialize bank info if not exists
-    if current_user.id not in bank_accounts:
-        bank_accounts[current_user.id] = {
-            "verified": random.choice([True, False]),  # Random for demo
-            "bankLast4": "1234" if random.choice([True, False]) else None
+    bank_info = bank_accounts.get(current_user.id)
+    if bank_info is None:
+        bank_info = bank_accounts[current_user.id] = {
+            "verified": bool(mock_rng.random() < 0.5),  # Random for demo
+            "bankLast4": "1234" if mock_rng.random() < 0.5 else None
         }
     
-    bank_info = bank_accounts[current_user.id]
-    
     return BankStatusResponse(
         verified=bank_info["verified"],
         bankLast4=bank_info["bankLast4"]
     )
 
 # Tax Management APIs
+TAX_AVAILABLE_FORMS = ("1099", "W-9")
+
 @api_router.get("/partner/tax/context", response_model=TaxContextResponse)
-async def get_tax_context(current_user: User = Depends(get_current_user)):
+async def get_tax_context(current_user: User = Depends(require_role("partner"))):
     """Get tax information context"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     # Mock tax info
     current_year = datetime.utcnow().year
     
     return TaxContextResponse(
-        status=random.choice(["complete", "incomplete"]),
-        availableForms=["1099", "W-9"],
+        status="complete" if mock_rng.random() < 0.5 else "incomplete",
+        availableForms=TAX_AVAILABLE_FORMS,
         year=current_year - 1
     )
 
 @api_router.post("/partner/tax/onboard", response_model=TaxOnboardResponse)
 async def onboard_tax_info(
     request: TaxOnboardRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Start tax information onboarding"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     # Mock tax onboarding URL
-    tax_url = f"https://tax.stripe.com/setup/{secrets.token_urlsafe(32)}?return_url={request.returnUrl}"
+    tax_url = cached_signed_url(
+        ("tax_onboard", current_user.id, request.returnUrl),
+        lambda token: f"https://tax.stripe.com/setup/{token}?return_url={request.returnUrl}"
+    )
     
     return TaxOnboardResponse(url=tax_url)
 
+TAX_FORMS = frozenset(("1099", "W-9", "W-8BEN"))
+
 @api_router.get("/partner/tax/forms/{form}/{year}", response_model=TaxFormResponse)
 async def download_tax_form(
     form: str,
     year: int,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Download tax form"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    if form not in ["1099", "W-9", "W-8BEN"]:
+    # Unknown forms stay a 404 rather than a Literal path param's 422
+    if form not in TAX_FORMS:
         raise HTTPException(status_code=404, detail="Form not found")
     
     # Mock tax form URL
-    form_url = f"https://tax-forms.shine.com/{form}/{year}/{current_user.id}.pdf?token={secrets.token_urlsafe(32)}"
+    form_url = cached_signed_url(
+        ("tax_form", current_user.id, form, year),
+        lambda token: f"https://tax-forms.shine.com/{form}/{year}/{current_user.id}.pdf?token={token}"
+    )
     
     return TaxFormResponse(url=form_url)
 
 # Notification Preferences APIs
+DEFAULT_NOTIFICATION_PREFS = {"payouts": True, "statements": True, "tax": True}
+
 @api_router.get("/partner/notifications/prefs", response_model=NotificationPrefsResponse)
-async def get_notification_prefs(current_user: User = Depends(get_current_user)):
+async def get_notification_prefs(current_user: User = Depends(require_role("partner"))):
     """Get notification preferences"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    if current_user.id not in notification_prefs:
-        notification_prefs[current_user.id] = {
-            "payouts": True,
-            "statements": True,
-            "tax": True
-        }
-    
-    prefs = notification_prefs[current_user.id]
+    # Partners who never saved preferences get the defaults without storing a copy
+    prefs = notification_prefs.get(current_user.id, DEFAULT_NOTIFICATION_PREFS)
     
     return NotificationPrefsResponse(
         payouts=prefs["payouts"],
@@ -3268,18 +4036,17 @@ async def get_notification_prefs(current_user: User = Depends(get_current_user))
 @api_router.post("/partner/notifications/prefs", response_model=dict)
 async def set_notification_prefs(
     request: NotificationPrefsRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """Set notification preferences"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     notification_prefs[current_user.id] = {
         "payouts": request.payouts,
         "statements": request.statements,
         "tax": request.tax
     }
     
+    return ok_response()
+
 # ================================================================================================
 # PAGE-10-SUPPORT: Support & Disputes System (Uber-like Help Center)
 # ================================================================================================
@@ -3356,12 +4123,37 @@ class TrainingGuidesResponse(BaseModel):
 # In-memory storage for support data (in production, use database)
 support_faqs = {}
 support_issues = {}
+# Secondary indexes over support_issues, kept in step by create and update
+support_issues_by_user = defaultdict(list)  # userId -> issue ids, oldest first
+open_support_issues = {}  # (userId, bookingId) -> the user's open issue on that booking
 support_tickets = {}
+
+# Running aggregates over tickets in "open" status, so owner metrics need no
+# scan: their creation times kept sorted, and the sum of those times as an
+# offset from a fixed reference
+SUPPORT_ESCALATION_AGE = timedelta(hours=24)
+SUPPORT_TIME_REFERENCE = datetime(2000, 1, 1)
+open_ticket_times = []
+open_ticket_offset_total = timedelta()
+
+def track_open_ticket(created_at: datetime):
+    global open_ticket_offset_total
+    bisect.insort(open_ticket_times, created_at)
+    open_ticket_offset_total += created_at - SUPPORT_TIME_REFERENCE
+
+def untrack_open_ticket(created_at: datetime):
+    global open_ticket_offset_total
+    del open_ticket_times[bisect.bisect_left(open_ticket_times, created_at)]
+    open_ticket_offset_total -= created_at - SUPPORT_TIME_REFERENCE
 training_guides = {}
+# The FAQ and guide lists never change once loaded, so their replies are
+# serialized once alongside them
+support_faqs_body = None
+training_guides_body = None
 
 def initialize_support_data():
     """Initialize mock support data"""
-    global support_faqs, training_guides
+    global support_faqs, training_guides, support_faqs_body, training_guides_body
     
     # Initialize FAQs
     if not support_faqs:
@@ -3407,6 +4199,7 @@ def initialize_support_data():
                 "answer": "We currently service major metropolitan areas. Check the app to see if service is available in your location."
             }
         }
+        support_faqs_body = orjson.dumps({"items": list(support_faqs.values())})
     
     # Initialize training guides for partners
     if not training_guides:
@@ -3448,15 +4241,13 @@ def initialize_support_data():
                 "url": "https://help.shine.com/partner/disputes"
             }
         }
+        training_guides_body = orjson.dumps({"items": list(training_guides.values())})
 
 # Support API Endpoints
 @api_router.get("/support/faqs", response_model=FAQListResponse)
 async def get_faqs(current_user: User = Depends(get_current_user)):
     """Get list of frequently asked questions"""
-    initialize_support_data()
-    
-    faqs = list(support_faqs.values())
-    return FAQListResponse(items=faqs)
+    return Response(content=support_faqs_body, media_type="application/json")
 
 @api_router.get("/support/issues", response_model=SupportIssuesList)
 async def list_support_issues(current_user: User = Depends(get_current_user)):
@@ -3464,15 +4255,15 @@ async def list_support_issues(current_user: User = Depends(get_current_user)):
     user_issues = []
     
     # Get issues for current user
-    for issue_id, issue_data in support_issues.items():
-        if issue_data.get("userId") == current_user.id:
-            user_issues.append(SupportIssue(
-                id=issue_id,
-                role=issue_data["role"],
-                category=issue_data["category"],
-                status=issue_data["status"],
-                lastUpdate=issue_data["lastUpdate"]
-            ))
+    for issue_id in support_issues_by_user.get(current_user.id, ()):
+        issue_data = support_issues[issue_id]
+        user_issues.append(SupportIssue(
+            id=issue_id,
+            role=issue_data["role"],
+            category=issue_data["category"],
+            status=issue_data["status"],
+            lastUpdate=issue_data["lastUpdate"]
+        ))
     
     # Sort by last update (most recent first)
     user_issues.sort(key=lambda x: x.lastUpdate, reverse=True)
@@ -3487,15 +4278,13 @@ async def create_support_issue(
     """Create a new support issue or dispute"""
     
     # Check for duplicate issues on same booking
-    if request.bookingId:
-        for issue_id, issue_data in support_issues.items():
-            if (issue_data.get("bookingId") == request.bookingId and 
-                issue_data.get("userId") == current_user.id and
-                issue_data.get("status") != "closed"):
-                raise HTTPException(status_code=409, detail="Issue already exists for this booking")
+    if request.bookingId and (current_user.id, request.bookingId) in open_support_issues:
+        raise HTTPException(status_code=409, detail="Issue already exists for this booking")
     
-    # Create new issue
+    # Create new issue; the issue and its ticket share one creation time
     issue_id = f"sup_{secrets.token_urlsafe(16)}"
+    now = datetime.utcnow()
+    now_iso = now.isoformat()
     issue_data = {
         "id": issue_id,
         "userId": current_user.id,
@@ -3506,11 +4295,14 @@ async def create_support_issue(
         "description": request.description,
         "photoIds": request.photoIds,
         "status": "open",
-        "createdAt": datetime.utcnow().isoformat(),
-        "lastUpdate": datetime.utcnow().isoformat()
+        "createdAt": now_iso,
+        "lastUpdate": now_iso
     }
     
     support_issues[issue_id] = issue_data
+    support_issues_by_user[current_user.id].append(issue_id)
+    if request.bookingId:
+        open_support_issues[(current_user.id, request.bookingId)] = issue_id
     
     # Add to support tickets for owner queue
     support_tickets[issue_id] = {
@@ -3519,9 +4311,11 @@ async def create_support_issue(
         "role": current_user.role,
         "category": request.category,
         "status": "open",
-        "createdAt": datetime.utcnow().isoformat(),
+        "createdAt": now_iso,
+        "createdAtTime": now,  # for SLA math without re-parsing createdAt
         "sla": 0.0  # Will be calculated based on time elapsed
     }
+    track_open_ticket(now)
     
     return CreateIssueResponse(id=issue_id, status="open")
 
@@ -3529,36 +4323,46 @@ async def create_support_issue(
 async def update_support_issue(
     issue_id: str,
     request: UpdateIssueRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("owner"))
 ):
     """Update support issue status (Owner/Admin only for now)"""
-    if current_user.role != "owner":
-        raise HTTPException(status_code=403, detail="Owner access required")
-    
-    if issue_id not in support_issues:
+    issue_data = support_issues.get(issue_id)
+    if issue_data is None:
         raise HTTPException(status_code=404, detail="Issue not found")
     
     # Update issue
-    support_issues[issue_id]["status"] = request.status
-    support_issues[issue_id]["lastUpdate"] = datetime.utcnow().isoformat()
+    issue_data["status"] = request.status
+    issue_data["lastUpdate"] = datetime.utcnow().isoformat()
     if request.notes:
-        support_issues[issue_id]["notes"] = request.notes
-    
-    # Update ticket in owner queue
-    if issue_id in support_tickets:
-        support_tickets[issue_id]["status"] = request.status
+        issue_data["notes"] = request.notes
+    
+    # Closing frees the booking for a new issue; reopening claims it again
+    if issue_data["bookingId"]:
+        booking_key = (issue_data["userId"], issue_data["bookingId"])
+        if request.status == "closed":
+            if open_support_issues.get(booking_key) == issue_id:
+                del open_support_issues[booking_key]
+        else:
+            open_support_issues.setdefault(booking_key, issue_id)
+    
+    # Update ticket in owner queue and the open-ticket aggregates
+    ticket_data = support_tickets.get(issue_id)
+    if ticket_data is not None:
+        was_open, is_open = ticket_data["status"] == "open", request.status == "open"
+        if was_open and not is_open:
+            untrack_open_ticket(ticket_data["createdAtTime"])
+        elif is_open and not was_open:
+            track_open_ticket(ticket_data["createdAtTime"])
+        ticket_data["status"] = request.status
     
     return {"ok": True}
 
 @api_router.post("/billing/refund", response_model=RefundResponse)
 async def process_refund(
     request: RefundRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("owner"))
 ):
     """Process refund for booking (Owner/Admin only)"""
-    if current_user.role != "owner":
-        raise HTTPException(status_code=403, detail="Owner access required")
-    
     # Mock refund processing
     # In production, integrate with Stripe for actual refunds
     
@@ -3575,56 +4379,40 @@ async def process_refund(
     return RefundResponse(ok=True, creditIssued=credit_issued)
 
 @api_router.get("/owner/support/queue", response_model=OwnerQueueResponse)
-async def get_owner_support_queue(current_user: User = Depends(get_current_user)):
+async def get_owner_support_queue(current_user: User = Depends(require_role("owner"))):
     """Get support ticket queue for owners"""
-    if current_user.role != "owner":
-        raise HTTPException(status_code=403, detail="Owner access required")
-    
-    tickets = []
     current_time = datetime.utcnow()
     
-    for ticket_id, ticket_data in support_tickets.items():
-        # Calculate SLA hours
-        created_at = datetime.fromisoformat(ticket_data["createdAt"].replace('Z', '+00:00'))
-        sla_hours = (current_time - created_at).total_seconds() / 3600
-        
-        tickets.append(SupportTicket(
-            id=ticket_data["id"],
-            user=ticket_data["user"],
-            role=ticket_data["role"],
-            category=ticket_data["category"],
-            status=ticket_data["status"],
-            createdAt=ticket_data["createdAt"],
-            sla=round(sla_hours, 1)
-        ))
-    
-    # Sort by SLA (longest first)
-    tickets.sort(key=lambda x: x.sla, reverse=True)
+    # Tickets are inserted as they are created, so oldest (longest SLA) come first
+    tickets = [
+        {
+            "id": ticket_data["id"],
+            "user": ticket_data["user"],
+            "role": ticket_data["role"],
+            "category": ticket_data["category"],
+            "status": ticket_data["status"],
+            "createdAt": ticket_data["createdAt"],
+            "sla": round((current_time - ticket_data["createdAtTime"]).total_seconds() / 3600, 1)
+        }
+        for ticket_data in support_tickets.values()
+    ]
     
-    return OwnerQueueResponse(tickets=tickets)
+    return ORJSONResponse({"tickets": tickets})
 
 @api_router.get("/owner/support/metrics", response_model=OwnerMetricsResponse)
-async def get_owner_support_metrics(current_user: User = Depends(get_current_user)):
+async def get_owner_support_metrics(current_user: User = Depends(require_role("owner"))):
     """Get support metrics for owners"""
-    if current_user.role != "owner":
-        raise HTTPException(status_code=403, detail="Owner access required")
+    current_time = datetime.utcnow()
+    open_tickets = len(open_ticket_times)
     
-    open_tickets = 0
+    # Total open age is count * (now - reference) minus the summed creation offsets
     total_sla_hours = 0.0
-    escalated_tickets = 0
-    current_time = datetime.utcnow()
+    if open_tickets:
+        total_age = (current_time - SUPPORT_TIME_REFERENCE) * open_tickets - open_ticket_offset_total
+        total_sla_hours = total_age.total_seconds() / 3600
     
-    for ticket_data in support_tickets.values():
-        created_at = datetime.fromisoformat(ticket_data["createdAt"].replace('Z', '+00:00'))
-        sla_hours = (current_time - created_at).total_seconds() / 3600
-        
-        if ticket_data["status"] == "open":
-            open_tickets += 1
-            total_sla_hours += sla_hours
-            
-            # Consider escalated if open for more than 24 hours
-            if sla_hours > 24:
-                escalated_tickets += 1
+    # Consider escalated if open for more than 24 hours
+    escalated_tickets = bisect.bisect_left(open_ticket_times, current_time - SUPPORT_ESCALATION_AGE)
     
     avg_sla_hours = total_sla_hours / max(open_tickets, 1)
     
@@ -3635,15 +4423,9 @@ async def get_owner_support_metrics(current_user: User = Depends(get_current_use
     )
 
 @api_router.get("/partner/training/guides", response_model=TrainingGuidesResponse)
-async def get_training_guides(current_user: User = Depends(get_current_user)):
+async def get_training_guides(current_user: User = Depends(require_role("partner"))):
     """Get training guides for partners"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
-    initialize_support_data()
-    
-    guides = list(training_guides.values())
-    return TrainingGuidesResponse(items=guides)
+    return Response(content=training_guides_body, media_type="application/json")
 
 # PAGE-11-BOOKINGS: Booking Management APIs
 
@@ -3736,18 +4518,40 @@ class BookingDetail(BaseModel):
 class InvoiceResponse(BaseModel):
     url: str
 
+# Booking list projections (fetch only the fields the list items read)
+CUSTOMER_BOOKING_LIST_PROJECTION = {
+    "_id": 0,
+    "booking_id": 1,
+    "status": 1,
+    "service.type": 1,
+    "address.line1": 1,
+    "address.city": 1,
+    "created_at": 1,
+    "totals.total": 1,
+    "totals.surge": 1,
+    "promo_code": 1,
+    "credits_applied": 1
+}
+PARTNER_BOOKING_LIST_PROJECTION = {
+    "_id": 0,
+    "booking_id": 1,
+    "status": 1,
+    "service.type": 1,
+    "address.line1": 1,
+    "address.city": 1,
+    "created_at": 1,
+    "totals.total": 1
+}
+
 # Booking List Endpoints
 @api_router.get("/bookings/customer", response_model=BookingListResponse)
 async def list_customer_bookings(
     status: str = Query(..., description="Status filter: upcoming|in_progress|past"),
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("customer"))
 ):
     """List customer bookings with status filtering"""
-    if current_user.role != "customer":
-        raise HTTPException(status_code=403, detail="Customer access required")
-    
     # Calculate skip for pagination
     skip = (page - 1) * size
     
@@ -3762,7 +4566,7 @@ async def list_customer_bookings(
     
     # Query database
     query = {"user_id": current_user.id, **status_filter}
-    cursor = db.bookings.find(query).sort("created_at", -1).skip(skip).limit(size + 1)
+    cursor = db.bookings.find(query, CUSTOMER_BOOKING_LIST_PROJECTION).sort("created_at", -1).skip(skip).limit(size + 1)
     bookings = await cursor.to_list(length=size + 1)
     
     # Check if there's a next page
@@ -3806,12 +4610,9 @@ async def list_partner_bookings(
     status: str = Query(..., description="Status filter: today|upcoming|completed"),
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("partner"))
 ):
     """List partner job bookings with status filtering"""
-    if current_user.role != "partner":
-        raise HTTPException(status_code=403, detail="Partner access required")
-    
     # Calculate skip for pagination
     skip = (page - 1) * size
     
@@ -3837,7 +4638,7 @@ async def list_partner_bookings(
     
     # Query database (partner jobs are bookings assigned to this partner)
     query = {"partner_id": current_user.id, **status_filter}
-    cursor = db.bookings.find(query).sort("created_at", -1).skip(skip).limit(size + 1)
+    cursor = db.bookings.find(query, PARTNER_BOOKING_LIST_PROJECTION).sort("created_at", -1).skip(skip).limit(size + 1)
     bookings = await cursor.to_list(length=size + 1)
     
     # Check if there's a next page
@@ -4009,6 +4810,10 @@ async def get_booking_detail(
         policy=policy
     )
 
+# Keyed BLAKE2b over the invoice path makes the signed URLs unforgeable without
+# the key. The configured secret is hashed down since BLAKE2b keys cap at 64 bytes
+INVOICE_SIGNING_KEY = hashlib.sha256(os.getenv("INVOICE_SIGNING_KEY", SECRET_KEY).encode()).digest()
+
 @api_router.get("/bookings/{booking_id}/invoice", response_model=InvoiceResponse)
 async def get_booking_invoice(
     booking_id: str,
@@ -4038,7 +4843,7 @@ async def get_booking_invoice(
     # Generate mock signed URL (15-minute TTL)
     # In production, this would generate a real signed URL for PDF storage
     timestamp = int(datetime.utcnow().timestamp())
-    signature = hashlib.md5(f"{booking_id}_{timestamp}".encode()).hexdigest()
+    signature = hashlib.blake2b(f"{booking_id}_{timestamp}".encode(), digest_size=16, key=INVOICE_SIGNING_KEY).hexdigest()
     signed_url = f"https://storage.shine.com/invoices/{booking_id}_{timestamp}_{signature}.pdf"
     
     return InvoiceResponse(url=signed_url)
@@ -4062,24 +4867,93 @@ async def get_status_checks():
 
 # Router will be included at the end after all endpoints are defined
 
+# CORS configuration (comma-separated origins; wildcard is invalid with credentials)
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:8081,http://localhost:19006").split(",")
+    if origin.strip()
+]
+CORS_MAX_AGE_SECONDS = 86400  # Let browsers cache preflight responses
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ORIGINS,
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
+    allow_headers=["Authorization", "Content-Type", "Idempotency-Key"],
+    max_age=CORS_MAX_AGE_SECONDS,
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging: handlers only enqueue records, a listener thread does the
+# stream I/O so request handlers never block on stderr
+log_queue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log_listener = QueueListener(log_queue, log_stream_handler, respect_handler_level=True)
+log_queue_handler = QueueHandler(log_queue)
+log_queue_handler.setFormatter(logging.Formatter('%(message)s'))  # full format applied by the listener
+logging.basicConfig(level=logging.INFO, handlers=[log_queue_handler])
+log_listener.start()
 logger = logging.getLogger(__name__)
 
+# Outbound HTTP / worker thread pool configuration
+HTTP_CLIENT_TIMEOUT_SECONDS = 5
+HTTP_MAX_CONNECTIONS = 200
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 50
+THREAD_POOL_TOKENS = 200  # Starlette default is 40
+
+@app.on_event("startup")
+async def init_http_client():
+    # Shared async HTTP client for outbound provider calls (presign, SOS, masked calls)
+    # so requests reuse pooled keep-alive connections instead of a new TLS handshake each
+    app.state.http = httpx.AsyncClient(
+        timeout=HTTP_CLIENT_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+        )
+    )
+    
+    # Raise the default thread pool limit used for sync endpoints and offloaded work
+    to_thread.current_default_thread_limiter().total_tokens = THREAD_POOL_TOKENS
+
+@app.on_event("startup")
+async def init_response_cache():
+    # Shared Redis-backed response cache when configured, per-process memory otherwise
+    if redis_client is not None:
+        FastAPICache.init(RedisBackend(redis_client), prefix="clnr")
+    else:
+        FastAPICache.init(InMemoryBackend(), prefix="clnr")
+
+@app.on_event("startup")
+async def start_location_flusher():
+    app.state.location_flusher = asyncio.create_task(run_location_flusher())
+
+@app.on_event("startup")
+async def start_auth_invalidation_listener():
+    app.state.auth_listener = asyncio.create_task(run_auth_invalidation_listener()) if redis_client is not None else None
+
+@app.on_event("startup")
+async def start_export_workers():
+    EXPORT_DIR.mkdir(exist_ok=True)
+    app.state.export_tasks = [asyncio.create_task(run_export_worker()) for _ in range(EXPORT_WORKERS)]
+    app.state.export_tasks.append(asyncio.create_task(run_export_sweeper()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    # Stop the location flusher and write out the final tick before Redis closes
+    app.state.location_flusher.cancel()
+    for export_task in app.state.export_tasks:
+        export_task.cancel()
+    if app.state.auth_listener is not None:
+        app.state.auth_listener.cancel()
+    await flush_location_updates()
+    await client.close()
+    await app.state.http.aclose()
+    if redis_client is not None:
+        await redis_client.close()
+    PASSWORD_HASH_POOL.shutdown(wait=False)
+    log_listener.stop()
 
 # Create indexes on startup
 @app.on_event("startup")
@@ -4090,19 +4964,25 @@ async def create_indexes():
     # Create unique sparse index on username_lower (allows null values)
     await db.users.create_index("username_lower", unique=True, sparse=True)
     
-    # Address indexes
-    await db.addresses.create_index("user_id")
-    await db.addresses.create_index([("user_id", 1), ("line1", 1), ("city", 1), ("postalCode", 1)])
-    await db.addresses.create_index("created_at")
+    # Sparse index on phone for SMS password resets (most users have no phone)
+    await db.users.create_index("phone", sparse=True)
+    
+    # Address indexes; the duplicate-check index also serves user_id listings
+    await db.addresses.create_indexes([
+        IndexModel([("user_id", 1), ("line1", 1), ("city", 1), ("postalCode", 1)]),
+        IndexModel("created_at")
+    ])
     
-    # Booking indexes
-    await db.bookings.create_index("user_id")
-    await db.bookings.create_index("partner_id")  # New index for partner queries
-    await db.bookings.create_index("booking_id", unique=True)
-    await db.bookings.create_index("status")
-    await db.bookings.create_index("created_at")
-    await db.bookings.create_index([("user_id", 1), ("status", 1), ("created_at", -1)])  # Compound index for customer queries
-    await db.bookings.create_index([("partner_id", 1), ("status", 1), ("created_at", -1)])  # Compound index for partner queries
+    # Booking indexes, built in one round trip. user_id / partner_id lookups
+    # are served by the compound indexes' leading key
+    await db.bookings.create_indexes([
+        IndexModel("booking_id", unique=True),
+        IndexModel("status"),
+        IndexModel("created_at"),
+        IndexModel([("user_id", 1), ("created_at", -1)]),  # Customer history without a status filter
+        IndexModel([("user_id", 1), ("status", 1), ("created_at", -1)]),  # Compound index for customer queries
+        IndexModel([("partner_id", 1), ("status", 1), ("created_at", -1)])  # Compound index for partner queries
+    ])
     
     logger.info("Created database indexes")
     
@@ -4111,6 +4991,9 @@ async def create_indexes():
     
     # Initialize mock discovery data for PAGE-12-DISCOVERY
     await initialize_mock_discovery_data()
+    
+    # Load the static FAQ and training guide content for PAGE-10-SUPPORT
+    initialize_support_data()
 
 # PAGE-12-DISCOVERY: Search & Favorites APIs
 
@@ -4606,12 +5489,9 @@ async def list_favorites(current_user: User = Depends(get_current_user)):
     return FavoritesListResponse(items=list(user_favs))
 
 @api_router.get("/analytics/discovery", response_model=DiscoveryAnalytics)
-async def get_discovery_analytics(current_user: User = Depends(get_current_user)):
+async def get_discovery_analytics(current_user: User = Depends(require_role("owner"))):
     """Get discovery analytics for owners"""
     
-    if current_user.role != "owner":
-        raise HTTPException(status_code=403, detail="Owner access required")
-    
     # Top searches (sorted by count)
     top_searches = [
         TopSearchTerm(term=term, count=count)
@@ -4750,6 +5630,16 @@ def calculate_surge_multiplier(zone_id: str, when_type: str) -> tuple[float, boo
         # Scheduled bookings have no surge
         return 1.0, False, None
 
+def compute_fare_totals(subtotal, surge_multiplier, tax_percent):
+    """Numeric fare core: returns (surge_amount, tax, total).
+    
+    Branch-free so it accepts NumPy arrays as well as floats for batch re-pricing.
+    """
+    surge_amount = subtotal * (surge_multiplier - 1.0)
+    tax = subtotal * (tax_percent / 100)
+    total = subtotal + surge_amount + tax
+    return surge_amount, tax, total
+
 def calculate_platform_fare(request: PricingRequest) -> tuple[Fare, List[FareBreakdown], Surge]:
     """Calculate platform-controlled fare"""
     
@@ -4805,18 +5695,16 @@ def calculate_platform_fare(request: PricingRequest) -> tuple[Fare, List[FareBre
         zone_id, request.when["type"]
     )
     
-    surge_amount = 0
+    surge_amount, tax, total = compute_fare_totals(
+        subtotal, surge_multiplier, PRICING_CONFIG["taxPercent"]
+    )
+    
     if surge_multiplier > 1.0:
-        surge_amount = subtotal * (surge_multiplier - 1.0)
         breakdown.append(FareBreakdown(
             label=f"Surge x{surge_multiplier}", 
             amount=round(surge_amount, 2)
         ))
     
-    # Calculate final total
-    tax = subtotal * (PRICING_CONFIG["taxPercent"] / 100)
-    total = (subtotal + surge_amount + tax)
-    
     return (
         Fare(
             subtotal=round(subtotal, 2),
@@ -4841,7 +5729,7 @@ async def get_pricing_quote(
         fare, breakdown, surge = calculate_platform_fare(request)
         
         # Generate estimate ID
-        estimate_id = f"EST-{request.serviceType[:2].upper()}-{random.randint(1000, 9999)}"
+        estimate_id = f"EST-{request.serviceType[:2].upper()}-{1000 + secrets.randbelow(9000)}"
         
         # Telemetry
         print(f"Telemetry: pricing.quote.request - role: {current_user.role}, serviceType: {request.serviceType}, total: {fare.total}")
@@ -4862,12 +5750,9 @@ async def get_pricing_quote(
         raise HTTPException(status_code=400, detail=str(e))
 
 @api_router.get("/pricing/rules", response_model=PricingRules)
-async def get_pricing_rules(current_user: User = Depends(get_current_user)):
+async def get_pricing_rules(current_user: User = Depends(require_role("owner"))):
     """Get pricing rules configuration (owner only)"""
     
-    if current_user.role != "owner":
-        raise HTTPException(status_code=403, detail="Owner access required")
-    
     return PricingRules(
         zones=[zone["zoneId"] for zone in PRICING_CONFIG["zones"]],
         baseFares=PRICING_CONFIG["baseFares"],
@@ -4939,17 +5824,21 @@ async def calculate_partner_payout(
         )
     )
 
+# Booking re-pricing tables
+BOOKING_BASE_PRICES = MappingProxyType({
+    "basic": 59, "standard": 89, "deep": 119,
+    "bathroom": 49, "move-out": 149
+})
+BOOKING_ADDON_PRICES = MappingProxyType({"inside_fridge": 15, "inside_oven": 15, "inside_windows": 20})
+
 # Update booking creation to support estimateId and re-pricing
 @api_router.post("/bookings", response_model=BookingResponse)
 async def create_booking_with_pricing(
     request: BookingRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_role("customer"))
 ):
     """Create booking with platform pricing validation"""
     
-    if current_user.role != "customer":
-        raise HTTPException(status_code=403, detail="Customer access required")
-    
     # Generate booking ID
     booking_id = f"bk_{random.randint(1000000, 9999999)}"
     
@@ -4961,24 +5850,20 @@ async def create_booking_with_pricing(
     
     # Calculate totals using existing logic but mark as platform-calculated
     service_type = request.service.type.lower()
-    base_prices = {
-        "basic": 59, "standard": 89, "deep": 119,
-        "bathroom": 49, "move-out": 149
-    }
-    base_price = base_prices.get(service_type, 100)
+    base_price = BOOKING_BASE_PRICES.get(service_type, 100)
     
     # Room calculations
     room_price = (request.service.bedrooms * 10) + (request.service.bathrooms * 12)
     
     # Addons
-    addon_prices = {"inside_fridge": 15, "inside_oven": 15, "inside_windows": 20}
-    addon_total = sum(addon_prices.get(addon, 0) for addon in request.service.addons)
+    addon_total = sum(BOOKING_ADDON_PRICES.get(addon, 0) for addon in request.service.addons)
     
     subtotal = base_price + room_price + addon_total
-    surge_multiplier = 1.2 if random.random() > 0.7 else 1.0  # 30% chance of surge
+    surge_multiplier = 1.2 if next_surge_draw()[0] else 1.0  # 30% chance of surge
     total = subtotal * surge_multiplier
     
     # Create booking document with pricing version
+    now = datetime.utcnow()
     booking_doc = {
         "booking_id": booking_id,
         "user_id": current_user.id,
@@ -5020,19 +5905,19 @@ async def create_booking_with_pricing(
         },
         "status": "pending_dispatch",
         "pricingEngineVersion": "v1.0",  # New field for platform pricing
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
+        "created_at": now,
+        "updated_at": now
     }
     
     # Save to database
     await db.bookings.insert_one(booking_doc)
     
     # Add to booking status tracking
-    booking_status[booking_id] = {
+    await save_booking_status(booking_id, {
         "status": "pending_dispatch",
         "partner_id": None,
-        "created_at": datetime.utcnow().isoformat()
-    }
+        "created_at": now.isoformat()
+    })
     
     # Telemetry
     print(f"Telemetry: checkout.reprice - bookingId: {booking_id}, total: {total}")
@@ -0,0 +1,159 @@
+"""Equivalence checks for the earnings and support fast paths in backend/server.py"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import orjson
+import pytest
+
+# server.py reads its Mongo settings at import; the client connects lazily
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+os.environ.pop("REDIS_URL", None)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+def make_user(user_id: str, role: str) -> server.User:
+    return server.User(id=user_id, email=f"{user_id}@example.com", password_hash="x", role=role)
+
+
+def response_json(response) -> dict:
+    return orjson.loads(response.body)
+
+
+# model_construct call sites: the skipped validation must not change the output
+
+def test_job_line_item_construct_matches_validation():
+    fields = dict(bookingId="bk_abc", date="2025-01-06T10:00:00", service="Cleaning", duration=90, payout=42.5, tip=7.25)
+    assert server.JobLineItem.model_construct(**fields).model_dump() == server.JobLineItem(**fields).model_dump()
+
+
+def test_payout_models_construct_match_validation():
+    fields = dict(id="po_abc", date="2025-01-06T10:00:00", amount=512.75, status="paid", destination="Bank ****1234")
+    constructed = server.PayoutItem.model_construct(**fields)
+    assert constructed.model_dump() == server.PayoutItem(**fields).model_dump()
+
+    items = [constructed, server.PayoutItem.model_construct(**{**fields, "id": "po_def", "status": "in_transit"})]
+    assert (
+        server.PayoutsListResponse.model_construct(items=items).model_dump()
+        == server.PayoutsListResponse(items=items).model_dump()
+    )
+
+
+def test_statement_detail_matches_validation():
+    partner = make_user("partner_detail", "partner")
+    body = response_json(asyncio.run(server.get_statement_detail("st_partner_detail_03", current_user=partner)))
+
+    assert body["jobs"]
+    assert server.StatementDetail(**body).model_dump() == body
+
+    jobs = [server.JobLineItem.model_construct(**job) for job in body["jobs"]]
+    fields = {**body, "jobs": jobs}
+    assert (
+        server.StatementDetail.model_construct(**fields).model_dump()
+        == server.StatementDetail(**fields).model_dump()
+    )
+
+
+def test_list_payouts_matches_validation():
+    partner = make_user("partner_payouts", "partner")
+    body = response_json(asyncio.run(server.list_payouts(current_user=partner)))
+
+    assert len(body["items"]) == server.MOCK_PAYOUT_WEEKS
+    assert body["items"][0]["status"] == "paid"
+    assert server.PayoutsListResponse(**body).model_dump() == body
+
+
+# Statement pages: built newest first for the page only, as the old
+# build-all/reverse/slice code returned them
+
+def reference_statements_page(partner_id: str, page: int, size: int) -> dict:
+    earnings_data = server.generate_earnings_data(partner_id)
+    statements = []
+    for i, week_start in enumerate(earnings_data["week_starts"]):
+        statements.append(server.StatementItem(
+            id=f"st_{partner_id}_{i:02d}",
+            weekLabel=f"Week {week_start.strftime('%b %d')} - {(week_start + timedelta(days=6)).strftime('%b %d')}",
+            amount=float(earnings_data["earnings"][i] + earnings_data["tips"][i]),
+            trips=int(earnings_data["jobs"][i]),
+            status="finalized" if i < server.EARNINGS_WEEKS - 1 else "pending",
+            payoutDate=(week_start + timedelta(days=7)).isoformat()
+        ))
+    statements.reverse()
+    start_idx = (page - 1) * size
+    end_idx = start_idx + size
+    next_page = page + 1 if end_idx < len(statements) else None
+    return server.StatementsListResponse(items=statements[start_idx:end_idx], nextPage=next_page).model_dump()
+
+
+@pytest.mark.parametrize("page,size", [(1, 10), (2, 10), (1, 5), (2, 5), (3, 5), (5, 3), (4, 3), (9, 5), (1, 50)])
+def test_statements_page_matches_reference(page, size):
+    partner_id = "partner_statements"
+    _, body = server.statements_page_body(partner_id, page, size)
+    assert orjson.loads(body) == reference_statements_page(partner_id, page, size)
+
+
+# Owner support metrics: running aggregates agree with a per-ticket scan
+
+@pytest.fixture
+def support_state():
+    server.support_issues.clear()
+    server.support_issues_by_user.clear()
+    server.open_support_issues.clear()
+    server.support_tickets.clear()
+    server.open_ticket_times.clear()
+    server.open_ticket_offset_total = timedelta()
+    yield
+    server.support_tickets.clear()
+    server.open_ticket_times.clear()
+    server.open_ticket_offset_total = timedelta()
+
+
+def reference_support_metrics(now: datetime) -> dict:
+    open_tickets = 0
+    total_sla_hours = 0.0
+    escalated_tickets = 0
+    for ticket_data in server.support_tickets.values():
+        sla_hours = (now - ticket_data["createdAtTime"]).total_seconds() / 3600
+        if ticket_data["status"] == "open":
+            open_tickets += 1
+            total_sla_hours += sla_hours
+            if sla_hours > 24:
+                escalated_tickets += 1
+    return {
+        "open": open_tickets,
+        "avgSlaHours": round(total_sla_hours / max(open_tickets, 1), 1),
+        "escalated": escalated_tickets
+    }
+
+
+def create_backdated_issue(customer: server.User, booking_id: str, age: timedelta) -> str:
+    request = server.CreateIssueRequest(bookingId=booking_id, role="customer", category="quality", description="d")
+    issue_id = asyncio.run(server.create_support_issue(request, current_user=customer)).id
+
+    # Move the ticket back in time, keeping the open-ticket aggregates in step
+    ticket_data = server.support_tickets[issue_id]
+    server.untrack_open_ticket(ticket_data["createdAtTime"])
+    ticket_data["createdAtTime"] -= age
+    server.track_open_ticket(ticket_data["createdAtTime"])
+    return issue_id
+
+
+def test_support_metrics_match_reference(support_state):
+    customer = make_user("customer_support", "customer")
+    owner = make_user("owner_support", "owner")
+    ages = [timedelta(hours=30.2), timedelta(hours=25.4), timedelta(hours=5.3), timedelta(hours=1.1)]
+    issue_ids = [create_backdated_issue(customer, f"bk_{i}", age) for i, age in enumerate(ages)]
+
+    def check():
+        metrics = asyncio.run(server.get_owner_support_metrics(current_user=owner)).model_dump()
+        assert metrics == reference_support_metrics(datetime.utcnow())
+
+    check()
+    for issue_id, new_status in [(issue_ids[0], "progress"), (issue_ids[0], "closed"), (issue_ids[2], "closed"), (issue_ids[0], "open"), (issue_ids[3], "open")]:
+        asyncio.run(server.update_support_issue(issue_id, server.UpdateIssueRequest(status=new_status), current_user=owner))
+        check()